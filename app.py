@@ -12,7 +12,10 @@
 #   "python-dotenv",
 #   "httpx",
 #   "markdown",
-#   "duckdb"
+#   "duckdb",
+#   "numpy",
+#   "pillow",
+#   "pyarrow"
 # ]
 # ///
 
@@ -133,6 +136,16 @@ function_definitions_llm = [
                     "type": "integer",
                     "minimum": 1,
                     "default": 10
+                },
+                "watch": {
+                    "type": "boolean",
+                    "default": False,
+                    "description": "Answer from a live index of the log directory kept up to date with inotify (polling fallback) instead of rescanning it."
+                },
+                "auto_update": {
+                    "type": "boolean",
+                    "default": False,
+                    "description": "Keep rewriting the output file whenever log files are created, modified or deleted."
                 }
             },
             "required": ["log_dir_path", "output_file_path", "num_files"]
@@ -153,6 +166,11 @@ function_definitions_llm = [
                     "type": "string",
                     "pattern": r".*/(.*\.json)",
                     "default": "/data/docs/index.json"
+                },
+                "fulltext": {
+                    "type": "boolean",
+                    "default": False,
+                    "description": "Also update the full-text search index over the documents."
                 }
             },
             "required": ["doc_dir_path", "output_file_path"]
@@ -171,8 +189,13 @@ function_definitions_llm = [
                 },
                 "output_file": {
                     "type": "string",
-                    "pattern": r".*/(.*\.txt)",
+                    "pattern": r".*/(.*\.(txt|csv))",
                     "default": "/data/email-sender.txt"
+                },
+                "bulk": {
+                    "type": "boolean",
+                    "default": False,
+                    "description": "Treat filename as an mbox file or Maildir directory and write a 'message-id, sender' row per message."
                 }
             },
             "required": ["filename", "output_file"]
@@ -193,6 +216,17 @@ function_definitions_llm = [
                     "type": "string",
                     "pattern": r".*/(.*\.png)",
                     "default": "/data/credit-card.png"
+                },
+                "preprocess": {
+                    "type": "boolean",
+                    "default": True,
+                    "description": "Crop, downsample and grayscale the image before sending it to the vision model."
+                },
+                "engine": {
+                    "type": "string",
+                    "enum": ["auto", "local", "llm"],
+                    "default": "auto",
+                    "description": "auto: local OCR, falling back to the vision model when unsure; local: OCR only; llm: vision model only. If image_path is a directory, every card in it is read and written to filename as CSV."
                 }
             },
             "required": ["filename", "image_path"]
@@ -215,6 +249,41 @@ function_definitions_llm = [
         "pattern": ".*/(.*\\.txt)",
         "default": "/data/comments-similar.txt",
         "description": "Path where the most similar pair of comments will be saved."
+      },
+      "k": {
+        "type": "integer",
+        "default": 1,
+        "description": "Number of most similar pairs to save, separated by blank lines."
+      },
+      "approximate": {
+        "type": "boolean",
+        "default": False,
+        "description": "Search random projections first and re-rank the candidates exactly; faster for very large files."
+      },
+      "ann": {
+        "type": "boolean",
+        "default": False,
+        "description": "Use the persistent nearest-neighbour index over the embedding store; for multi-million-comment files."
+      },
+      "nprobe": {
+        "type": "integer",
+        "default": 8,
+        "description": "With ann, how many neighbouring index lists to compare; higher is slower but finds more of the true pairs."
+      },
+      "minhash": {
+        "type": "boolean",
+        "default": False,
+        "description": "Find near-duplicate text with MinHash LSH instead of embeddings; works offline."
+      },
+      "threshold": {
+        "type": "number",
+        "default": 0.5,
+        "description": "With minhash, the Jaccard similarity the LSH bands are tuned to catch."
+      },
+      "backend": {
+        "type": "string",
+        "enum": ["remote", "local"],
+        "description": "Embedding backend: remote (text-embedding-3-small) or local (hashed character n-grams, offline). Defaults to $EMBEDDING_BACKEND, else remote."
       }
     },
     "required": ["filename", "output_filename"]
@@ -274,6 +343,11 @@ function_definitions_llm = [
                     "type": "string",
                     "pattern": r".*/.*",
                     "description": "Path to save the downloaded content."
+                },
+                "use_cache": {
+                    "type": "boolean",
+                    "default": True,
+                    "description": "Serve fresh cached copies and revalidate stale ones instead of downloading again."
                 }
             },
             "required": ["url", "save_path"]
@@ -306,6 +380,29 @@ function_definitions_llm = [
       "commit_message": {
         "type": "string",
         "description": "Commit message for the new file."
+      },
+      "branch": {
+        "type": "string",
+        "description": "Branch to check out instead of the default one."
+      },
+      "depth": {
+        "type": "integer",
+        "description": "Shallow clone with only this many recent commits."
+      },
+      "sparse": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": "Only check out these directories (plus top-level files)."
+      },
+      "reference": {
+        "type": "boolean",
+        "default": False,
+        "description": "Share objects with the local mirror through alternates instead of hardlinking them."
+      },
+      "use_mirror": {
+        "type": "boolean",
+        "default": True,
+        "description": "Clone from a locally cached mirror of the repository, fetching only what changed."
       }
     },
     "required": ["repo_url", "target_dir", "filename", "filecontent", "commit_message"]
@@ -328,8 +425,26 @@ function_definitions_llm = [
                 },
                 "output_filename": {
                     "type": "string",
-                    "pattern": r".*/(.*\.txt)",
-                    "description": "Path to the file where the query result will be saved."
+                    "pattern": r".*/(.*\.(txt|csv|jsonl|ndjson|parquet))",
+                    "description": "Path to the file where the query result will be saved. The extension picks the format: txt (tab-separated rows, or the bare value), csv, jsonl or parquet."
+                },
+                "max_rows": {
+                    "type": "integer",
+                    "description": "Stop after this many rows."
+                },
+                "engine": {
+                    "type": "string",
+                    "enum": ["auto", "sqlite", "duckdb"],
+                    "default": "auto",
+                    "description": "auto runs analytical queries (GROUP BY, window functions, joins) on DuckDB and the rest on SQLite."
+                },
+                "threads": {
+                    "type": "integer",
+                    "description": "DuckDB worker threads; defaults to all cores."
+                },
+                "memory_limit": {
+                    "type": "string",
+                    "description": "DuckDB memory limit such as '2GB'; defaults to $DUCKDB_MEMORY_LIMIT or 2GB."
                 }
             },
             "required": ["db_path", "query", "output_filename"]
@@ -349,15 +464,38 @@ function_definitions_llm = [
                 "output_filename": {
                     "type": "string",
                     "pattern": r".*/.*",
-                    "description": "Path to the file where the content will be saved."
-                }
+                    "description": "Path to the file where the content will be saved; JSON Lines when crawling."
+                },
+                "use_cache": {
+                    "type": "boolean",
+                    "default": True,
+                    "description": "Serve fresh cached copies and revalidate stale ones instead of downloading again."
+                },
+                "urls": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Crawl these pages (and url, if given), writing one JSON line per page."
+                },
+                "fields": {
+                    "type": "object",
+                    "additionalProperties": {},
+                    "description": "Crawl: field name -> CSS selector, e.g. {\"title\": \"h1\", \"price\": \"span.price::text\", \"image\": \"img::attr(src)\"}. Wrap a selector in a list to get every match."
+                },
+                "follow": {
+                    "type": "string",
+                    "description": "Crawl: regex of links to follow from fetched pages."
+                },
+                "max_pages": {"type": "integer", "default": 100, "description": "Crawl: maximum pages to fetch."},
+                "max_depth": {"type": "integer", "default": 1, "description": "Crawl: link hops to follow from the start pages."},
+                "per_host": {"type": "integer", "default": 2, "description": "Crawl: concurrent requests per host."},
+                "delay": {"type": "number", "default": 0.5, "description": "Crawl: seconds between requests to one host."}
             },
-            "required": ["url", "output_filename"]
+            "required": ["output_filename"]
         }
     },
 {
   "name": "B7",
-  "description": "Process an image by optionally resizing it and saving the result to an output path.",
+  "description": "Process an image by optionally resizing, cropping, rotating, flipping, converting to grayscale or compressing it in one pass and saving the result to an output path.",
   "parameters": {
     "type": "object",
     "properties": {
@@ -380,6 +518,26 @@ function_definitions_llm = [
         "minItems": 2,
         "maxItems": 2,
         "description": "Optional. Resize dimensions as [width, height]."
+      },
+      "operations": {
+        "type": "array",
+        "items": {
+          "type": "object",
+          "properties": {
+            "op": {"type": "string", "enum": ["resize", "thumbnail", "crop", "rotate", "flip", "grayscale", "orient", "compress"]},
+            "size": {"type": "array", "items": {"type": "integer", "minimum": 1}, "description": "resize/thumbnail: [width, height]; thumbnail keeps the aspect ratio."},
+            "box": {"type": "array", "items": {"type": "integer"}, "description": "crop: [left, top, right, bottom]."},
+            "angle": {"type": "number", "description": "rotate: degrees counter-clockwise."},
+            "direction": {"type": "string", "enum": ["horizontal", "vertical"], "description": "flip direction."},
+            "quality": {"type": "integer", "minimum": 1, "maximum": 100, "description": "compress: encoder quality."}
+          },
+          "required": ["op"]
+        },
+        "description": "Optional. Operations applied in order in one pass, e.g. [{\"op\": \"crop\", \"box\": [0, 0, 800, 600]}, {\"op\": \"grayscale\"}, {\"op\": \"compress\", \"quality\": 80}]."
+      },
+      "save_options": {
+        "type": "object",
+        "description": "Optional. Encoder options for the output format, e.g. {\"quality\": 80, \"progressive\": true}."
       }
     },
     "required": ["image_path", "output_path"]
@@ -429,7 +587,7 @@ function_definitions_llm = [
 
     {
   "name": "B10",
-  "description": "Filter the CSV file and return JSON data by filtering rows where the specified column equals the given value, then saving the output to the specified path.",
+  "description": "Filter the CSV file and return JSON data by filtering rows where the specified column equals the given value and/or matching further predicates, optionally projecting, sorting and limiting the rows, then saving the output to the specified path.",
   "parameters": {
     "type": "object",
     "properties": {
@@ -449,12 +607,77 @@ function_definitions_llm = [
       "output_path": {
         "type": "string",
         "pattern": ".*/.*",
-        "description": "Path where the filtered JSON data will be saved."
+        "description": "Path where the filtered JSON data will be saved: a JSON array, or JSON Lines if it ends in .jsonl."
+      },
+      "use_cache": {
+        "type": "boolean",
+        "default": True,
+        "description": "Keep a columnar copy of the CSV next to it and filter that instead of re-parsing the text."
+      },
+      "index_columns": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": "Columns to build an index on right away; repeatedly filtered columns are indexed automatically."
+      },
+      "predicates": {
+        "type": "array",
+        "items": {
+          "type": "object",
+          "properties": {
+            "column": {"type": "string"},
+            "op": {"type": "string", "enum": ["eq", "in", "lt", "le", "gt", "ge", "between", "prefix"]},
+            "value": {"description": "A value; a list for in, or [low, high] for between."}
+          },
+          "required": ["column", "value"]
+        },
+        "description": "Further conditions that must all hold, e.g. age between [30, 40] and city prefix \"New\"."
+      },
+      "columns": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": "Columns to include in the output, in order (default: all)."
+      },
+      "sort": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": "Columns to sort by; prefix a column with - for descending order."
+      },
+      "limit": {
+        "type": "integer",
+        "description": "Maximum number of rows to write."
       }
     },
-    "required": ["csv_path", "filter_column", "filter_value", "output_path"]
+    "required": ["csv_path", "output_path"]
   }
-}
+},
+    {
+        "name": "B11",
+        "description": "Run a SQL query directly over CSV, JSON/JSONL or Parquet files in /data (e.g. SELECT ... FROM '/data/sales.csv') and save the result to an output file.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "DuckDB SQL. Files can be queried by path in FROM, or by the names given in tables."
+                },
+                "output_filename": {
+                    "type": "string",
+                    "pattern": r".*/(.*\.(txt|csv|json|jsonl|ndjson|parquet))",
+                    "description": "Path to the output file; the extension picks the format."
+                },
+                "tables": {
+                    "type": "object",
+                    "additionalProperties": {"type": "string"},
+                    "description": "Optional table name -> data file path mapping."
+                },
+                "max_rows": {
+                    "type": "integer",
+                    "description": "Stop after this many rows."
+                }
+            },
+            "required": ["query", "output_filename"]
+        }
+    }
 
 
 ]
@@ -532,10 +755,35 @@ async def run_task(task: str):
             B7(**json.loads(arguments))
         if "B9" == task_code:
             B9(**json.loads(arguments))
+        if "B11" == task_code:
+            B11(**json.loads(arguments))
         return {"message": f"{task_code} Task '{task}' executed successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+# Full-text search over the documents indexed by A6
+@app.get("/search")
+def search_docs(q: str = Query(..., description="Terms, \"quoted phrases\" and prefix* queries"),
+                k: int = Query(10, ge=1),
+                doc_dir: str = "/data/docs",
+                refresh: bool = False):
+    # Plain def: FastAPI runs it in a worker thread, since refresh can re-index.
+    doc_dir = os.path.realpath(doc_dir)
+    if not (doc_dir == "/data" or doc_dir.startswith("/data/")):
+        raise HTTPException(status_code=403, detail="Docs directory must be under /data.")
+    if not os.path.isdir(doc_dir):
+        raise HTTPException(status_code=404, detail="Docs directory not found")
+    try:
+        return docs_search(q, k=k, doc_dir_path=doc_dir, refresh=refresh)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Hit and byte counters of the B3/B6 HTTP cache since startup
+@app.get("/http-cache")
+def http_cache_metrics():
+    cache = http_cache()
+    return {"root": cache.root, "max_bytes": cache.max_bytes, **cache.metrics}
+
 # Placeholder for file reading
 @app.get("/read", response_class=PlainTextResponse)
 async def read_file(path: str = Query(..., description="File path to read")):
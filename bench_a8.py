@@ -0,0 +1,83 @@
+# bench_a8.py
+
+# Compares A8 with and without image preprocessing on datagen.py's
+# credit-card fixtures: upload bytes, end-to-end latency and digit accuracy.
+# The local OCR engine is measured too; it needs no network.
+
+# Usage: uv run bench_a8.py [--count=10] [--offline]
+
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "faker",
+#     "pillow",
+#     "numpy",
+#     "requests",
+#     "python-dateutil",
+#     "python-dotenv",
+#     "scipy",
+# ]
+# ///
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+import datagen
+from tasksA import ocr_card_number, preprocess_card_image, read_card_number
+
+
+def render_fixture(root, email):
+    os.makedirs(root, exist_ok=True)
+    datagen.config["root"] = root
+    datagen.config["email"] = email
+    datagen.a8_credit_card_image()
+    return os.path.join(root, "credit_card.png"), datagen.get_credit_card(email)["number"]
+
+
+def main(count, offline):
+    totals = {mode: {"bytes": 0, "latency": 0.0, "correct": 0} for mode in ("original", "preprocessed", "local")}
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(count):
+            email = f"bench{i}@example.com"
+            image_path, expected = render_fixture(os.path.join(tmp, str(i)), email)
+            for mode in totals:
+                if mode == "local":
+                    started = time.perf_counter()
+                    number, _ = ocr_card_number(image_path)
+                    totals[mode]["latency"] += time.perf_counter() - started
+                    totals[mode]["correct"] += number == expected
+                    continue
+                preprocess = mode == "preprocessed"
+                if offline:
+                    with open(image_path, "rb") as f:
+                        size = len(preprocess_card_image(image_path)) if preprocess else len(f.read())
+                    totals[mode]["bytes"] += size
+                    continue
+                answer, stats = read_card_number(image_path, preprocess=preprocess)
+                correct = re.sub(r"\D", "", answer) == re.sub(r"\D", "", expected)
+                totals[mode]["bytes"] += stats["upload_bytes"]
+                totals[mode]["latency"] += stats["latency"]
+                totals[mode]["correct"] += correct
+                print(f"{email} {mode}: {'ok' if correct else 'WRONG'} {answer.strip()!r} expected {expected}")
+
+    for mode, total in totals.items():
+        line = f"{mode:>12}: {total['bytes'] / count:10.0f} bytes/image"
+        if not offline or mode == "local":
+            line += f" {total['latency'] / count:7.3f} s/image {total['correct']}/{count} correct"
+        print(line)
+    if not offline and totals["preprocessed"]["correct"] < totals["original"]["correct"]:
+        print("REGRESSION: preprocessing reduced digit accuracy")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark A8 image preprocessing")
+    parser.add_argument("--count", type=int, default=10, help="Number of fixture cards to render")
+    parser.add_argument("--offline", action="store_true", help="Only compare payload sizes; no model calls")
+    args = parser.parse_args()
+    sys.exit(main(args.count, args.offline))
@@ -0,0 +1,93 @@
+# bench_a9.py
+
+# Measures the A9 embedding index against exact search on synthetic clustered
+# vectors: build and update time, neighbour recall@k and top-pair recall for a
+# range of nprobe values. Runs offline; vectors go into a throwaway store.
+
+# Usage: uv run bench_a9.py [--count=20000] [--dim=256] [--queries=200] [--k=10]
+
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "numpy",
+#     "httpx",
+#     "pillow",
+#     "scipy",
+#     "python-dateutil",
+# ]
+# ///
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from tasksA import EmbeddingIndex, EmbeddingStore, top_similar_pairs
+
+
+def synthetic_vectors(count, dim, seed=0):
+    # Clustered unit-ish vectors with some planted near-duplicates.
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, count // 50), dim))
+    vectors = centers[rng.integers(len(centers), size=count)] + 0.6 * rng.standard_normal((count, dim))
+    planted = rng.choice(count, size=(count // 200, 2), replace=False)
+    vectors[planted[:, 1]] = vectors[planted[:, 0]] + 0.01 * rng.standard_normal((len(planted), dim))
+    return vectors.astype(np.float32)
+
+
+def main(count, dim, queries, k):
+    vectors = synthetic_vectors(count, dim)
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = EmbeddingStore(tmp, model="bench")
+        initial = count * 3 // 4
+        store.put([f"row {i}" for i in range(initial)], vectors[:initial])
+        index = EmbeddingIndex(store)
+
+        started = time.perf_counter()
+        index.update()
+        print(f"build: {initial} rows in {time.perf_counter() - started:.2f}s")
+        store.put([f"row {i}" for i in range(initial, count)], vectors[initial:])
+        started = time.perf_counter()
+        added = index.update()
+        print(f"update: {added} rows in {time.perf_counter() - started:.2f}s")
+
+        query_rows = np.random.default_rng(1).choice(count, queries, replace=False)
+        started = time.perf_counter()
+        truth = []
+        for row in query_rows:
+            similarity = unit @ unit[row]
+            similarity[row] = -np.inf
+            truth.append(set(np.argsort(-similarity)[:k].tolist()))
+        exact_search = (time.perf_counter() - started) / queries
+
+        started = time.perf_counter()
+        exact_pairs = {(i, j) for _, i, j in top_similar_pairs(vectors, k=k)}
+        exact_pair_time = time.perf_counter() - started
+        print(f"exact: {exact_search * 1000:.2f} ms/query, top-{k} pairs in {exact_pair_time:.2f}s")
+
+        for nprobe, rerank in ((1, 4), (4, 4), (8, 4), (8, 16), (16, 16), (32, 32)):
+            started = time.perf_counter()
+            found = index.neighbors(query_rows.tolist(), k, nprobe, rerank)
+            search_time = (time.perf_counter() - started) / queries
+            recall = np.mean([len(truth_set & {row for _, row in hits}) / k for truth_set, hits in zip(truth, found)])
+            started = time.perf_counter()
+            pairs = {(i, j) for _, i, j in index.similar_pairs(k, nprobe)}
+            pair_time = time.perf_counter() - started
+            print(f"nprobe={nprobe:>2} rerank={rerank:>2}: recall@{k} {recall:.3f} {search_time * 1000:.2f} ms/query, "
+                  f"pair recall {len(pairs & exact_pairs) / k:.2f} in {pair_time:.2f}s")
+
+        started = time.perf_counter()
+        groups = index.near_duplicates(0.99)
+        print(f"near-duplicate groups (>= 0.99): {len(groups)} in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the A9 embedding index")
+    parser.add_argument("--count", type=int, default=20000, help="Number of vectors")
+    parser.add_argument("--dim", type=int, default=256, help="Vector dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Neighbour queries to sample")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours / pairs per query")
+    args = parser.parse_args()
+    main(args.count, args.dim, args.queries, args.k)
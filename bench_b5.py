@@ -0,0 +1,106 @@
+# bench_b5.py
+
+# Compares SQLite and DuckDB (through its sqlite scanner) on a scaled-up
+# ticket-sales database like datagen.py's: wall time per query and whether
+# both engines return the same rows. Floats are compared to 1e-9 relative,
+# since the engines sum in different orders. The nullable region column checks
+# that NULLs sort where SQLite puts them.
+
+# Usage: uv run bench_b5.py [--rows=5000000] [--threads=4] [--memory-limit=2GB]
+
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "duckdb",
+#     "numpy",
+#     "httpx",
+#     "pillow",
+#     "scipy",
+#     "python-dateutil",
+# ]
+# ///
+
+import argparse
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from tasksA import sqlite_connection
+from tasksB import duckdb_sqlite_connection
+
+QUERIES = {
+    "group by": "SELECT type, SUM(units * price), COUNT(*), AVG(price) FROM tickets GROUP BY type ORDER BY type",
+    "window": "SELECT type, units, SUM(units * price) OVER (PARTITION BY type ORDER BY units) AS running"
+              " FROM (SELECT type, units, SUM(price) AS price FROM tickets GROUP BY type, units) ORDER BY type, units",
+    "join": "SELECT t.type, COUNT(*) FROM tickets t JOIN (SELECT type, AVG(price) AS mean FROM tickets GROUP BY type) m"
+            " ON t.type = m.type WHERE t.price > m.mean GROUP BY t.type ORDER BY t.type",
+    "distinct": "SELECT COUNT(*) FROM (SELECT DISTINCT units, ROUND(price) FROM tickets)",
+    "nulls asc": "SELECT region, COUNT(*), SUM(units) FROM tickets GROUP BY region ORDER BY region",
+    "nulls desc": "SELECT region, type, MAX(price) FROM tickets GROUP BY region, type ORDER BY region DESC, type",
+}
+
+
+def build_database(path, rows, seed=0):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE tickets (type TEXT NOT NULL, units INTEGER NOT NULL, price DECIMAL(10,2) NOT NULL, region TEXT)")
+    for start in range(0, rows, 100_000):
+        conn.executemany("INSERT INTO tickets VALUES (?, ?, ?, ?)",
+                         ((rng.choice(["Gold", "Silver", "Bronze"]), rng.randint(1, 10), round(rng.uniform(50, 150), 2),
+                           rng.choice(["north", "south", "east", "west", None]))
+                          for _ in range(min(100_000, rows - start))))
+    conn.commit()
+    conn.close()
+
+
+def same_rows(left, right):
+    if len(left) != len(right):
+        return False
+    for a, b in zip(left, right):
+        for x, y in zip(a, b):
+            if isinstance(x, float) or isinstance(y, float):
+                if not math.isclose(float(x), float(y), rel_tol=1e-9):
+                    return False
+            elif x != y:
+                return False
+    return True
+
+
+def main(rows, threads, memory_limit):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ticket-sales.db")
+        started = time.perf_counter()
+        build_database(path, rows)
+        print(f"built {rows} rows in {time.perf_counter() - started:.1f}s")
+        try:
+            duck = duckdb_sqlite_connection(path, threads, memory_limit)
+        except Exception as e:
+            print(f"DuckDB sqlite scanner unavailable: {e}")
+            return 1
+        mismatches = 0
+        with duck, sqlite_connection(path) as conn:
+            for name, query in QUERIES.items():
+                started = time.perf_counter()
+                expected = conn.execute(query).fetchall()
+                sqlite_time = time.perf_counter() - started
+                started = time.perf_counter()
+                got = duck.execute(query).fetchall()
+                duckdb_time = time.perf_counter() - started
+                same = same_rows(expected, got)
+                mismatches += not same
+                print(f"{name:>10}: sqlite {sqlite_time:7.3f}s duckdb {duckdb_time:7.3f}s "
+                      f"({sqlite_time / duckdb_time:5.1f}x) {'same' if same else 'DIFFERENT'}")
+        return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark B5 engines on scaled ticket-sales data")
+    parser.add_argument("--rows", type=int, default=5_000_000, help="Rows in the tickets table")
+    parser.add_argument("--threads", type=int, default=None, help="DuckDB threads (default: all cores)")
+    parser.add_argument("--memory-limit", default=None, help="DuckDB memory limit, e.g. 2GB")
+    args = parser.parse_args()
+    sys.exit(main(args.rows, args.threads, args.memory_limit))
@@ -0,0 +1,103 @@
+# bench_b7.py
+
+# Compares one B7 call with an operations list against the same steps run as
+# chained single-operation calls (decode and encode per step) on a synthetic
+# multi-megapixel JPEG, and reports how far the outputs differ.
+
+# Usage: uv run bench_b7.py [--width=6000] [--height=4000] [--repeat=3]
+
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "numpy",
+#     "httpx",
+#     "pillow",
+# ]
+# ///
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+import tasksB
+
+PIPELINES = {
+    "thumbnail": [{"op": "thumbnail", "size": [640, 640]}, {"op": "compress", "quality": 80}],
+    "crop+rotate+gray+thumb": [{"op": "crop", "box": [500, 500, 5500, 3500]}, {"op": "rotate", "angle": 90},
+                               {"op": "grayscale"}, {"op": "thumbnail", "size": [800, 800]}],
+    "gray+resize": [{"op": "grayscale"}, {"op": "resize", "size": [1200, 800]}],
+}
+
+
+def synthetic_photo(path, width, height, seed=0):
+    # Smooth gradients plus noise, so the JPEG is photo-like rather than flat.
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    channels = [127 + 100 * np.sin(x / (150 + 40 * c) + y / (230 - 30 * c)) for c in range(3)]
+    pixels = np.stack(channels, axis=-1) + rng.normal(0, 12, (height, width, 3))
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(path, quality=92)
+
+
+def chained(source, output, operations, tmp):
+    # Each operation as its own call: what a client had to do before.
+    current = source
+    for i, operation in enumerate(operations):
+        if operation["op"] == "compress":
+            continue
+        step = output if i == len(operations) - 1 else os.path.join(tmp, f"step{i}.jpg")
+        with Image.open(current) as img:
+            if operation["op"] == "thumbnail":
+                img = img.copy()
+                img.thumbnail(operation["size"], reducing_gap=None)
+            elif operation["op"] == "resize":
+                img = img.resize(operation["size"])
+            elif operation["op"] == "crop":
+                img = img.crop(operation["box"])
+            elif operation["op"] == "rotate":
+                img = img.rotate(operation["angle"], expand=True)
+            elif operation["op"] == "grayscale":
+                img = img.convert("L")
+            img.save(step, quality=operation.get("quality", 95))
+        current = step
+    if current != output:
+        os.replace(current, output)
+
+
+def best_of(repeat, function, *args):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main(width, height, repeat):
+    tasksB.B12 = lambda path: True  # benchmark files live in a temp dir
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "photo.jpg")
+        synthetic_photo(source, width, height)
+        print(f"source: {width}x{height} JPEG, {os.path.getsize(source) / 1e6:.1f} MB")
+        for name, operations in PIPELINES.items():
+            chained_out, pipeline_out = os.path.join(tmp, "chained.jpg"), os.path.join(tmp, "pipeline.jpg")
+            chained_time = best_of(repeat, chained, source, chained_out, operations, tmp)
+            pipeline_time = best_of(repeat, tasksB.B7, source, pipeline_out, None, operations)
+            with Image.open(chained_out) as a, Image.open(pipeline_out) as b:
+                size = b.size
+                b = b.convert(a.mode).resize(a.size)
+                diff = np.abs(np.asarray(a, np.float32) - np.asarray(b, np.float32)).mean()
+            print(f"{name:>24}: chained {chained_time:6.3f}s pipeline {pipeline_time:6.3f}s "
+                  f"({chained_time / pipeline_time:4.1f}x) -> {size[0]}x{size[1]}, mean abs diff {diff:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the B7 operation pipeline")
+    parser.add_argument("--width", type=int, default=6000, help="Source image width")
+    parser.add_argument("--height", type=int, default=4000, help="Source image height")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is reported)")
+    args = parser.parse_args()
+    main(args.width, args.height, args.repeat)
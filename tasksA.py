@@ -10,7 +10,7 @@ import json
 from pathlib import Path
 import os
 import requests
-from scipy.spatial.distance import cosine
+import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -66,7 +66,182 @@ def A4(filename="/data/contacts.json", targetfile="/data/contacts-sorted.json"):
     with open(targetfile, 'w') as file:
         json.dump(sorted_contacts, file, indent=4)
 
-def A5(log_dir_path='/data/logs', output_file_path='/data/logs-recent.txt', num_files=10):
+# A5 watch mode: an mtime-ordered index of the log directory, kept live by
+# inotify (or polling when inotify is unavailable) so queries never rescan.
+import bisect
+import threading
+
+class LogIndex:
+    def __init__(self, log_dir):
+        self.log_dir = Path(log_dir)
+        self.lock = threading.Lock()
+        self.entries = {}  # name -> (mtime, first_line)
+        self.order = []    # sorted (mtime, name), oldest first
+
+    def _drop(self, name):
+        old = self.entries.pop(name, None)
+        if old is not None:
+            i = bisect.bisect_left(self.order, (old[0], name))
+            if i < len(self.order) and self.order[i] == (old[0], name):
+                del self.order[i]
+
+    def refresh(self, name):
+        # Re-read a single file; returns True if the index changed.
+        if not name.endswith('.log'):
+            return False
+        path = self.log_dir / name
+        try:
+            mtime = os.path.getmtime(path)
+            with path.open('r') as f_in:
+                first_line = f_in.readline().strip()
+        except (OSError, UnicodeDecodeError):
+            # Gone, unreadable or not text: leave it out of the index.
+            with self.lock:
+                if name not in self.entries:
+                    return False
+                self._drop(name)
+            return True
+        with self.lock:
+            if self.entries.get(name) == (mtime, first_line):
+                return False
+            self._drop(name)
+            self.entries[name] = (mtime, first_line)
+            bisect.insort(self.order, (mtime, name))
+        return True
+
+    def scan(self):
+        # Full rescan: used once at startup and on every polling tick.
+        changed = False
+        seen = set()
+        for entry in os.scandir(self.log_dir):
+            if not entry.name.endswith('.log'):
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+            except OSError:
+                continue  # removed mid-scan
+            seen.add(entry.name)
+            cached = self.entries.get(entry.name)
+            if cached is None or cached[0] != mtime:
+                changed |= self.refresh(entry.name)
+        with self.lock:
+            gone = [name for name in self.entries if name not in seen]
+            for name in gone:
+                self._drop(name)
+        return changed or bool(gone)
+
+    def recent(self, num_files=10):
+        # First lines of the num_files most recently modified logs, newest first.
+        with self.lock:
+            return [self.entries[name][1] for _, name in reversed(self.order[-num_files:])] if num_files > 0 else []
+
+
+IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE = 0x002, 0x004, 0x008
+IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x040, 0x080, 0x100, 0x200
+IN_Q_OVERFLOW = 0x4000
+
+def inotify_open(path):
+    # Returns an inotify fd watching path, or None where inotify is unavailable.
+    import ctypes, ctypes.util
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    if libc.inotify_add_watch(fd, os.fsencode(str(path)), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+def inotify_names(fd, timeout):
+    # Wait up to timeout seconds and return the set of changed file names.
+    # None in the result means the kernel queue overflowed and a rescan is needed.
+    import select
+    import struct
+    names = set()
+    if not select.select([fd], [], [], timeout)[0]:
+        return names
+    try:
+        buf = os.read(fd, 64 * 1024)
+    except BlockingIOError:
+        return names
+    offset = 0
+    while offset < len(buf):
+        _, mask, _, length = struct.unpack_from('iIII', buf, offset)
+        offset += 16
+        name = buf[offset:offset + length].rstrip(b'\0')
+        offset += length
+        names.add(None if mask & IN_Q_OVERFLOW else os.fsdecode(name))
+    return names
+
+class LogWatcher(threading.Thread):
+    def __init__(self, log_dir, poll_interval=1.0):
+        super().__init__(daemon=True)
+        self.index = LogIndex(log_dir)
+        self.poll_interval = poll_interval
+        self.outputs = {}  # output_file_path -> num_files, rewritten on change
+        self.stopped = threading.Event()
+        # Watch first, then scan, so nothing changing in between is missed.
+        self.fd = inotify_open(self.index.log_dir)
+        self.index.scan()
+        self.mode = 'inotify' if self.fd is not None else 'poll'
+
+    def write_output(self, output_file_path, num_files):
+        with open(output_file_path, 'w') as f_out:
+            for first_line in self.index.recent(num_files):
+                f_out.write(f"{first_line}\n")
+
+    def run(self):
+        import logging
+        while not self.stopped.is_set():
+            try:
+                if self.fd is None:
+                    self.stopped.wait(self.poll_interval)
+                    changed = self.index.scan()
+                else:
+                    names = inotify_names(self.fd, self.poll_interval)
+                    if None in names:
+                        changed = self.index.scan()
+                    else:
+                        changed = any([self.index.refresh(name) for name in names])
+                if changed:
+                    for output_file_path, num_files in list(self.outputs.items()):
+                        self.write_output(output_file_path, num_files)
+            except Exception as e:
+                # Keep watching; a failed tick is retried on the next event or poll.
+                logging.getLogger(__name__).warning("Error while watching %s: %s", self.index.log_dir, e)
+                self.stopped.wait(self.poll_interval)
+        if self.fd is not None:
+            os.close(self.fd)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+log_watchers = {}
+
+def watch_logs(log_dir_path='/data/logs', poll_interval=1.0):
+    # Start (or reuse) the background watcher for a log directory.
+    key = os.path.abspath(log_dir_path)
+    watcher = log_watchers.get(key)
+    if watcher is None or not watcher.is_alive():
+        watcher = log_watchers[key] = LogWatcher(key, poll_interval)
+        watcher.start()
+    return watcher
+
+def A5(log_dir_path='/data/logs', output_file_path='/data/logs-recent.txt', num_files=10, watch=False, auto_update=False):
+    if watch or auto_update:
+        # Answer from the live index instead of rescanning the directory.
+        watcher = watch_logs(log_dir_path)
+        watcher.write_output(output_file_path, num_files)
+        if auto_update:
+            watcher.outputs[output_file_path] = num_files
+        return
+
     log_dir = Path(log_dir_path)
     output_file = Path(output_file_path)
 
@@ -80,50 +255,530 @@ def A5(log_dir_path='/data/logs', output_file_path='/data/logs-recent.txt', num_
                 first_line = f_in.readline().strip()
                 f_out.write(f"{first_line}\n")
 
-def A6(doc_dir_path='/data/docs', output_file_path='/data/docs/index.json'):
-    import os
-    import json
-    import re
+# A6: the manifest remembers (mtime, size, title) per Markdown file so re-runs
+# only re-read files that are new or changed since the last index build.
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+h1_regex = re.compile(r'^\s*#\s+(.*)')
+
+def first_h1(file_path, chunk_size=64 * 1024, max_line=64 * 1024):
+    # Read the file in bounded chunks and stop at the first H1 line. Lines
+    # longer than max_line bytes are only matched on their first max_line bytes.
+    with open(file_path, 'rb') as f:
+        pending = b''
+        skipping = False
+        while True:
+            chunk = f.read(chunk_size)
+            if skipping:
+                # Drop the rest of an over-long line.
+                newline = chunk.find(b'\n')
+                if newline < 0 and chunk:
+                    continue
+                chunk = chunk[newline + 1:] if newline >= 0 else b''
+                skipping = False
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop() if chunk else b''
+            if len(pending) > max_line:
+                lines.append(pending[:max_line])
+                pending, skipping = b'', True
+            for line in lines:
+                match = h1_regex.match(line.decode('utf-8', errors='ignore' if len(line) == max_line else 'strict'))
+                if match:
+                    return match.group(1).strip()
+            if not chunk and not skipping:
+                return None
+
+def scan_markdown(docs_dir):
+    # Yield (relative_path, mtime_ns, size) for every Markdown file under docs_dir.
+    stack = [docs_dir]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith('.md'):
+                    st = entry.stat()
+                    relative_path = os.path.relpath(entry.path, docs_dir).replace('\\', '/')
+                    yield relative_path, st.st_mtime_ns, st.st_size
+
+def load_manifest(manifest_path, docs_dir):
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if manifest.get('doc_dir') != os.path.abspath(docs_dir):
+        return {}
+    return manifest.get('files', {})
+
+def write_json_atomic(path, data, **kwargs):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp_path, path)
+
+def A6(doc_dir_path='/data/docs', output_file_path='/data/docs/index.json', manifest_path=None, workers=None, fulltext=False):
     docs_dir = doc_dir_path
-    index_data = {}
-    
-    # Regular expression to match an H1 header, allowing for leading whitespace.
-    h1_regex = re.compile(r'^\s*#\s+(.*)')
-    
-    # Walk through all files in the docs directory.
-    for root, _, files in os.walk(docs_dir):
-        for file in files:
-            if file.endswith('.md'):
-                file_path = os.path.join(root, file)
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        match = h1_regex.match(line)
-                        if match:
-                            title = match.group(1).strip()
-                            # Compute the relative path from docs_dir and replace backslashes with forward slashes.
-                            relative_path = os.path.relpath(file_path, docs_dir).replace('\\', '/')
-                            index_data[relative_path] = title
-                            break  # Only the first H1 is needed.
-    
-    # Write the index data to the output file.
-    with open(output_file_path, 'w', encoding='utf-8') as f:
-        json.dump(index_data, f, indent=4)
-    
+    if manifest_path is None:
+        manifest_path = os.path.join(os.path.dirname(output_file_path), '.index-manifest.json')
+
+    # path -> [mtime_ns, size, title]; title is None when the file has no H1.
+    previous = load_manifest(manifest_path, docs_dir)
+    files = {}
+    stale = []
+    for relative_path, mtime_ns, size in scan_markdown(docs_dir):
+        cached = previous.get(relative_path)
+        if cached is not None and cached[0] == mtime_ns and cached[1] == size:
+            files[relative_path] = cached
+        else:
+            files[relative_path] = [mtime_ns, size, None]
+            stale.append(relative_path)
+
+    # Only new or changed files are opened, in parallel. Deleted files simply
+    # never make it into the new manifest.
+    if stale:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            titles = pool.map(lambda p: first_h1(os.path.join(docs_dir, p)), stale)
+            for relative_path, title in zip(stale, titles):
+                files[relative_path][2] = title
+
+    index_data = {path: entry[2] for path, entry in sorted(files.items()) if entry[2] is not None}
+
+    # Nothing new, changed or deleted: the files on disk are already current.
+    unchanged = not stale and len(files) == len(previous)
+    if not unchanged:
+        write_json_atomic(manifest_path, {'doc_dir': os.path.abspath(docs_dir), 'files': files})
+    if not unchanged or not os.path.exists(output_file_path):
+        with open(output_file_path, 'w', encoding='utf-8') as f:
+            json.dump(index_data, f, indent=4)
+
+    if fulltext:
+        update_docs_search_index(docs_dir, workers=workers)
+
     return index_data
 
 
-def A7(filename='/data/email.txt', output_file='/data/email-sender.txt'):
-    # Read the content of the email
-    with open(filename, 'r') as file:
-        email_content = file.readlines()
+# Full-text search over the docs tree. The index is a set of immutable
+# segments, each a handful of .npy arrays that are memory-mapped at query time:
+#   seg-N-terms.npy         sorted terms, utf-8 bytes concatenated
+#   seg-N-term-offsets.npy  term i is terms[offsets[i]:offsets[i + 1]]
+#   seg-N-lexicon.npy       (postings offset, doc frequency) per term
+#   seg-N-postings.npy      per doc: local doc id, tf, then tf positions
+# manifest.json records each document's (mtime_ns, size, segment, local id,
+# length), so an update only tokenizes new or changed files into a fresh
+# segment; superseded postings are masked out until the next compaction.
+import heapq
+import math
+from array import array
+import numpy as np
+
+token_regex = re.compile(r'\w+')
+
+def tokenize(text):
+    return token_regex.findall(text.lower())
+
+def build_postings(token_lists):
+    # term -> {local doc id: positions}, with doc ids in ascending order.
+    postings = {}
+    for local, tokens in enumerate(token_lists):
+        for position, term in enumerate(tokens):
+            postings.setdefault(term, {}).setdefault(local, []).append(position)
+    return postings
+
+def write_segment(index_dir, seg_id, postings):
+    base = os.path.join(index_dir, f'seg-{seg_id}')
+    terms = sorted(postings)
+    encoded = [term.encode('utf-8') for term in terms]
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(term) for term in encoded])
+    lexicon = np.zeros((len(terms), 2), dtype=np.int64)
+    flat = array('I')
+    for i, term in enumerate(terms):
+        docs = postings[term]
+        lexicon[i] = len(flat), len(docs)
+        for local in sorted(docs):
+            flat.append(local)
+            flat.append(len(docs[local]))
+            flat.extend(docs[local])
+    save_array_atomic(f'{base}-terms.npy', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    save_array_atomic(f'{base}-term-offsets.npy', offsets)
+    save_array_atomic(f'{base}-lexicon.npy', lexicon)
+    save_array_atomic(f'{base}-postings.npy', np.frombuffer(flat.tobytes(), dtype=np.uint32))
+
+def save_array_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, data)
+    os.replace(tmp_path, path)
+
+def remove_segment(index_dir, seg_id):
+    for part in ('terms', 'term-offsets', 'lexicon', 'postings'):
+        try:
+            os.remove(os.path.join(index_dir, f'seg-{seg_id}-{part}.npy'))
+        except FileNotFoundError:
+            pass
+
+def load_array(path):
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        # numpy refuses to memory-map zero-length arrays
+        return np.load(path)
+
+class Segment:
+    def __init__(self, index_dir, seg_id, paths, docs):
+        base = os.path.join(index_dir, f'seg-{seg_id}')
+        self.terms = load_array(f'{base}-terms.npy')
+        self.offsets = load_array(f'{base}-term-offsets.npy')
+        self.lexicon = load_array(f'{base}-lexicon.npy')
+        self.postings = load_array(f'{base}-postings.npy')
+        self.num_terms = len(self.lexicon)
+        self.paths = paths
+        # A local doc is live only while the manifest still points at this copy.
+        self.live = [docs.get(path, [None] * 4)[2:4] == [seg_id, local] for local, path in enumerate(paths)]
+
+    def term_bytes(self, i):
+        return self.terms[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    def lower_bound(self, key):
+        lo, hi = 0, self.num_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def term_postings(self, i):
+        start, df = (int(x) for x in self.lexicon[i])
+        result = {}
+        for _ in range(df):
+            local, tf = int(self.postings[start]), int(self.postings[start + 1])
+            if self.live[local]:
+                result[self.paths[local]] = self.postings[start + 2:start + 2 + tf]
+            start += 2 + tf
+        return result
+
+    def lookup(self, term):
+        key = term.encode('utf-8')
+        i = self.lower_bound(key)
+        if i < self.num_terms and self.term_bytes(i) == key:
+            return self.term_postings(i)
+        return {}
+
+    def expand(self, prefix, limit):
+        key = prefix.encode('utf-8')
+        i = self.lower_bound(key)
+        found = []
+        while i < self.num_terms and len(found) < limit:
+            term = self.term_bytes(i)
+            if not term.startswith(key):
+                break
+            found.append(term.decode('utf-8'))
+            i += 1
+        return found
+
+class SearchIndex:
+    def __init__(self, index_dir):
+        with open(os.path.join(index_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        self.docs = manifest['docs']
+        self.segments = [Segment(index_dir, int(seg_id), paths, self.docs)
+                         for seg_id, paths in manifest['segments'].items()]
+        self.num_docs = len(self.docs)
+        self.avgdl = sum(entry[4] for entry in self.docs.values()) / self.num_docs if self.num_docs else 0.0
 
-    sender_email = "sujay@gmail.com"
-    for line in email_content:
-        if "From" == line[:4]:
-            sender_email = (line.strip().split(" ")[-1]).replace("<", "").replace(">", "")
+    def lookup(self, term):
+        # path -> positions, across every segment
+        result = {}
+        for segment in self.segments:
+            result.update(segment.lookup(term))
+        return result
+
+    def bm25(self, tfs, k1=1.2, b=0.75):
+        # tfs: path -> term (or phrase) frequency for a single query clause
+        df = len(tfs)
+        idf = math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+        scores = {}
+        for path, tf in tfs.items():
+            norm = k1 * (1 - b + b * self.docs[path][4] / self.avgdl) if self.avgdl else k1
+            scores[path] = idf * tf * (k1 + 1) / (tf + norm)
+        return scores
+
+    def clause_scores(self, kind, value, max_expansions=64):
+        if kind == 'term':
+            return self.bm25({path: len(positions) for path, positions in self.lookup(value).items()})
+        if kind == 'prefix':
+            terms = sorted({term for segment in self.segments for term in segment.expand(value, max_expansions)})
+            scores = {}
+            for term in terms[:max_expansions]:
+                for path, score in self.clause_scores('term', term).items():
+                    scores[path] = scores.get(path, 0.0) + score
+            return scores
+        # phrase: every term must occur at consecutive positions
+        postings = [self.lookup(term) for term in value]
+        candidates = set(postings[0]).intersection(*postings[1:]) if postings else set()
+        tfs = {}
+        for path in candidates:
+            starts = set(int(p) for p in postings[0][path])
+            for offset, term_postings in enumerate(postings[1:], 1):
+                starts &= {int(p) - offset for p in term_postings[path]}
+            if starts:
+                tfs[path] = len(starts)
+        return self.bm25(tfs)
+
+    def search(self, query, k=10):
+        clauses = parse_query(query)
+        if not clauses:
+            return []
+        combined = None
+        for kind, value in clauses:
+            scores = self.clause_scores(kind, value)
+            if combined is None:
+                combined = scores
+            else:
+                # every clause has to match
+                combined = {path: combined[path] + score for path, score in scores.items() if path in combined}
+        top = heapq.nlargest(k, combined.items(), key=lambda item: (item[1], item[0]))
+        return [{'path': path, 'score': round(score, 6)} for path, score in top]
+
+def parse_query(query):
+    # "quoted phrase", prefix*, or bare terms; terms are tokenized like documents.
+    clauses = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        if phrase:
+            tokens = tokenize(phrase)
+        elif word.endswith('*') and len(tokenize(word)) == 1:
+            clauses.append(('prefix', tokenize(word)[0]))
+            continue
+        else:
+            tokens = tokenize(word)
+        if len(tokens) == 1:
+            clauses.append(('term', tokens[0]))
+        elif tokens:
+            clauses.append(('phrase', tokens))
+    return clauses
+
+def read_tokens(file_path):
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        return tokenize(f.read())
+
+def update_docs_search_index(doc_dir_path='/data/docs', index_dir=None, max_segments=8, workers=None):
+    docs_dir = doc_dir_path
+    if index_dir is None:
+        index_dir = os.path.join(docs_dir, '.search-index')
+    os.makedirs(index_dir, exist_ok=True)
+    manifest_path = os.path.join(index_dir, 'manifest.json')
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = None
+    if manifest is None or manifest.get('doc_dir') != os.path.abspath(docs_dir):
+        manifest = {'doc_dir': os.path.abspath(docs_dir), 'docs': {}, 'segments': {}, 'next_segment': 0}
+    docs, segments = manifest['docs'], manifest['segments']
+
+    current = {path: (mtime_ns, size) for path, mtime_ns, size in scan_markdown(docs_dir)}
+    changed = [path for path, stat in current.items() if path not in docs or tuple(docs[path][:2]) != stat]
+    removed = [path for path in docs if path not in current]
+    if not changed and not removed:
+        if not os.path.exists(manifest_path):
+            write_json_atomic(manifest_path, manifest)
+        return manifest
+
+    for path in removed:
+        del docs[path]
+    if changed:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            token_lists = list(pool.map(lambda p: read_tokens(os.path.join(docs_dir, p)), changed))
+        seg_id = manifest['next_segment']
+        manifest['next_segment'] += 1
+        write_segment(index_dir, seg_id, build_postings(token_lists))
+        segments[str(seg_id)] = changed
+        for local, (path, tokens) in enumerate(zip(changed, token_lists)):
+            docs[path] = [*current[path], seg_id, local, len(tokens)]
+
+    # Drop segments whose documents have all been replaced or deleted.
+    obsolete = []
+    for seg_id, paths in list(segments.items()):
+        if not any(docs.get(path, [None] * 4)[2:4] == [int(seg_id), local] for local, path in enumerate(paths)):
+            del segments[seg_id]
+            obsolete.append(seg_id)
+
+    if len(segments) > max_segments:
+        obsolete += compact_docs_search_index(index_dir, manifest)
+    write_json_atomic(manifest_path, manifest)
+    # Segment files go only once the manifest no longer references them.
+    for seg_id in obsolete:
+        remove_segment(index_dir, seg_id)
+    return manifest
+
+def compact_docs_search_index(index_dir, manifest):
+    # Merge every segment's live postings into a single new segment and
+    # return the ids of the segments it replaces.
+    docs, segments = manifest['docs'], manifest['segments']
+    paths = sorted(docs)
+    local_ids = {path: local for local, path in enumerate(paths)}
+    merged = {}
+    for seg_id, seg_paths in segments.items():
+        segment = Segment(index_dir, int(seg_id), seg_paths, docs)
+        for i in range(segment.num_terms):
+            term_postings = segment.term_postings(i)
+            if term_postings:
+                target = merged.setdefault(segment.term_bytes(i).decode('utf-8'), {})
+                for path, positions in term_postings.items():
+                    target[local_ids[path]] = positions.tolist()
+    seg_id = manifest['next_segment']
+    manifest['next_segment'] += 1
+    write_segment(index_dir, seg_id, merged)
+    manifest['segments'] = {str(seg_id): paths}
+    for local, path in enumerate(paths):
+        docs[path][2:4] = [seg_id, local]
+    return list(segments)
+
+search_indexes = {}
+
+def docs_search(query, k=10, doc_dir_path='/data/docs', index_dir=None, refresh=False):
+    if index_dir is None:
+        index_dir = os.path.join(doc_dir_path, '.search-index')
+    manifest_path = os.path.join(index_dir, 'manifest.json')
+    if refresh or not os.path.exists(manifest_path):
+        update_docs_search_index(doc_dir_path, index_dir)
+    # Reuse the loaded index (and its memory maps) until the manifest changes.
+    version = os.stat(manifest_path).st_mtime_ns
+    cached = search_indexes.get(index_dir)
+    if cached is None or cached[0] != version:
+        cached = search_indexes[index_dir] = (version, SearchIndex(index_dir))
+    return cached[1].search(query, k)
+
+
+# A7 bulk mode: sender extraction over mbox files and Maildir directories.
+# Only the header block of each message is parsed; bodies are skipped.
+import csv
+import mmap
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from email.utils import parseaddr
+
+def parse_headers(data):
+    # Parse an RFC 2822 header block (bytes, up to the first blank line),
+    # unfolding continuation lines. Returns {lowercase name: first value}.
+    headers = {}
+    name = value = None
+    for raw in data.split(b'\n'):
+        line = raw.rstrip(b'\r').decode('utf-8', errors='replace')
+        if not line:
             break
+        if line[0] in ' \t' and name is not None:
+            value += ' ' + line.strip()
+            continue
+        if name is not None:
+            headers.setdefault(name, value)
+        name, _, value = line.partition(':')
+        name, value = name.strip().lower(), value.strip()
+    if name is not None:
+        headers.setdefault(name, value)
+    return headers
+
+angle_addr_regex = re.compile(r'<([^<>"]+@[^<>"]+)>')
+
+def header_sender(headers):
+    # Bare address from From: (falling back to Sender:). The <angle-addr> is
+    # taken from the raw header first, so a display name (encoded or not, with
+    # or without commas) never leaks into the address.
+    value = headers.get('from') or headers.get('sender') or ''
+    angle_addrs = angle_addr_regex.findall(value)
+    if angle_addrs:
+        return angle_addrs[-1].strip()
+    return parseaddr(value)[1]
+
+def read_header_block(path, chunk_size=8192):
+    # Read only as far as the blank line that ends the headers.
+    data = b''
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            data += chunk
+            if not chunk or b'\n\n' in data or b'\r\n\r\n' in data:
+                return data
+
+def maildir_senders(paths):
+    rows = []
+    for path in paths:
+        headers = parse_headers(read_header_block(path))
+        rows.append((headers.get('message-id', ''), header_sender(headers)))
+    return rows
+
+def mbox_senders(path, start, end):
+    # Senders of messages whose "From " separator line begins in [start, end).
+    rows = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if start == 0 and mm[:5] == b'From ':
+            pos = 0
+        else:
+            pos = mm.find(b'\nFrom ', max(start - 1, 0)) + 1 or -1
+        while 0 <= pos < end:
+            header_start = mm.find(b'\n', pos) + 1 or len(mm)
+            next_pos = mm.find(b'\nFrom ', header_start) + 1 or len(mm)
+            # The header block ends at the first blank line (LF or CRLF).
+            ends = [i for i in (mm.find(b'\n\n', header_start, next_pos), mm.find(b'\n\r\n', header_start, next_pos)) if i >= 0]
+            headers = parse_headers(mm[header_start:min(ends) + 1 if ends else next_pos])
+            rows.append((headers.get('message-id', ''), header_sender(headers)))
+            pos = next_pos if next_pos < len(mm) else -1
+    return rows
+
+def mailbox_jobs(mailbox_path, chunk_bytes, batch_size):
+    # Yield (function, args) work units: byte ranges of an mbox file, or
+    # batches of message files from a Maildir (cur/ and new/) or plain directory.
+    if os.path.isfile(mailbox_path):
+        size = os.path.getsize(mailbox_path)
+        for start in range(0, size, chunk_bytes):
+            yield mbox_senders, (mailbox_path, start, min(start + chunk_bytes, size))
+        return
+    subdirs = [os.path.join(mailbox_path, d) for d in ('cur', 'new') if os.path.isdir(os.path.join(mailbox_path, d))]
+    batch = []
+    for directory in subdirs or [mailbox_path]:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith('.'):
+                    batch.append(entry.path)
+                    if len(batch) >= batch_size:
+                        yield maildir_senders, (batch,)
+                        batch = []
+    if batch:
+        yield maildir_senders, (batch,)
+
+def extract_senders(mailbox_path, output_file, workers=None, chunk_bytes=32 * 1024 * 1024, batch_size=1000):
+    # Fan work units out across processes, keeping only a bounded window in
+    # flight, and stream "message-id, sender" rows to output_file in order.
+    workers = workers or os.cpu_count() or 1
+    count = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(output_file, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.writer(out)
+        writer.writerow(['message-id', 'sender'])
+        in_flight = deque()
+        for fn, args in mailbox_jobs(mailbox_path, chunk_bytes, batch_size):
+            in_flight.append(pool.submit(fn, *args))
+            if len(in_flight) >= 2 * workers:
+                rows = in_flight.popleft().result()
+                writer.writerows(rows)
+                count += len(rows)
+        while in_flight:
+            rows = in_flight.popleft().result()
+            writer.writerows(rows)
+            count += len(rows)
+    return count
 
-    # Get the extracted email address
+def A7(filename='/data/email.txt', output_file='/data/email-sender.txt', bulk=False, workers=None):
+    if bulk:
+        # filename is an mbox file or a Maildir directory
+        return extract_senders(filename, output_file, workers=workers)
+
+    # Only the headers are needed; they end at the first blank line.
+    headers = parse_headers(read_header_block(filename))
+    sender_email = header_sender(headers) or "sujay@gmail.com"
 
     # Write the email address to the output file
     with open(output_file, 'w') as file:
@@ -136,11 +791,75 @@ def png_to_base64(image_path):
     return base64_string
 
 
-def A8(filename='/data/credit_card.txt', image_path='/data/credit_card.png'):
-    import os
-    import json
+# A8 preprocessing: crop to the text, shrink, go grayscale and re-encode before
+# the image is uploaded. Results are cached on disk by content hash.
+import hashlib
+import io
+import logging
+import time
+
+def text_bbox(gray, threshold=40):
+    # Bounding box (left, top, right, bottom) of pixels that differ from the
+    # dominant background shade, plus the median height of the text lines.
+    pixels = np.asarray(gray, dtype=np.int16)
+    background = np.bincount(pixels.ravel(), minlength=256).argmax()
+    mask = np.abs(pixels - background) > threshold
+    rows, cols = np.flatnonzero(mask.any(axis=1)), np.flatnonzero(mask.any(axis=0))
+    if not len(rows):
+        return None, None
+    # Consecutive runs of text rows are the individual lines.
+    breaks = np.flatnonzero(np.diff(rows) > 1)
+    starts = np.concatenate(([rows[0]], rows[breaks + 1]))
+    ends = np.concatenate((rows[breaks], [rows[-1]]))
+    line_height = float(np.median(ends - starts + 1))
+    return (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1), line_height
+
+def preprocess_card_image(image_path, cache_dir=None, line_height=20, padding=8):
+    # Returns compact PNG bytes for the vision model.
+    from PIL import Image
+    with open(image_path, 'rb') as f:
+        raw = f.read()
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(image_path)), '.a8-cache')
+    key = hashlib.sha256(raw + f'|{line_height}|{padding}'.encode()).hexdigest()
+    cache_path = os.path.join(cache_dir, f'{key}.png')
+    if os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            return f.read()
+
+    with Image.open(io.BytesIO(raw)) as img:
+        gray = img.convert('L')
+    bbox, text_height = text_bbox(gray)
+    if bbox is not None:
+        left, top, right, bottom = bbox
+        gray = gray.crop((max(left - padding, 0), max(top - padding, 0),
+                          min(right + padding, gray.width), min(bottom + padding, gray.height)))
+        # Downsample only as far as keeps a text line about line_height pixels tall.
+        scale = line_height / text_height
+        if scale < 1:
+            gray = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))), Image.LANCZOS)
+    out = io.BytesIO()
+    gray.save(out, format='PNG', optimize=True)
+    data = out.getvalue()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(f'{cache_path}.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(f'{cache_path}.tmp', cache_path)
+    return data
+
+
+def read_card_number(image_path, preprocess=True):
+    # Ask the vision model for the card number. Returns the model's answer and
+    # payload/latency stats: bytes of the original image vs. what was uploaded.
     import requests
 
+    started = time.perf_counter()
+    with open(image_path, 'rb') as image_file:
+        image_bytes = image_file.read()
+    upload_bytes = preprocess_card_image(image_path) if preprocess else image_bytes
+    image_base64 = base64.b64encode(upload_bytes).decode('utf-8')
+
     # Refine the prompt to explicitly require exactly 16 digits.
     prompt_text = (
         "Extract exactly the 16-digit credit card number from this image. "
@@ -162,7 +881,7 @@ def A8(filename='/data/credit_card.txt', image_path='/data/credit_card.png'):
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/png;base64,{png_to_base64(image_path)}"
+                            "url": f"data:image/png;base64,{image_base64}"
                         }
                     }
                 ]
@@ -183,85 +902,1163 @@ def A8(filename='/data/credit_card.txt', image_path='/data/credit_card.png'):
     response.raise_for_status()
     result = response.json()
 
-    # Extract the card number, remove any spaces.
-    card_number = result['choices'][0]['message']['content'].strip().replace(" ", "")
-    
+    stats = {
+        "original_bytes": len(image_bytes),
+        "upload_bytes": len(upload_bytes),
+        "latency": time.perf_counter() - started,
+    }
+    return result['choices'][0]['message']['content'], stats
+
+
+# A8 local OCR: the card number is drawn in a known font on a flat background,
+# so connected-component segmentation plus nearest-template matching reads it
+# in milliseconds. Anything uncertain (or failing the Luhn check) goes to the LLM.
+glyph_size = 16
+digit_template_cache = []
+
+def glyph_vector(ink):
+    # Scale a glyph's ink crop to glyph_size pixels tall (keeping its aspect
+    # ratio), centre it, and return it as a zero-mean unit vector.
+    from PIL import Image
+    rows, cols = np.flatnonzero(ink.any(axis=1)), np.flatnonzero(ink.any(axis=0))
+    if len(rows):
+        ink = ink[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    height, width = ink.shape
+    crop = Image.fromarray(np.uint8(255 * ink / max(float(ink.max()), 1e-6)))
+    scaled_width = max(1, min(glyph_size, round(width * glyph_size / height)))
+    canvas = Image.new('L', (glyph_size, glyph_size), 0)
+    canvas.paste(crop.resize((scaled_width, glyph_size), Image.BILINEAR), ((glyph_size - scaled_width) // 2, 0))
+    vector = np.asarray(canvas, dtype=np.float32).ravel()
+    vector -= vector.mean()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def ink_glyphs(gray, threshold=0.3):
+    # Binarize against the dominant background shade and return
+    # (left, top, right, bottom), ink crop for every connected component.
+    from scipy import ndimage
+    pixels = np.asarray(gray)
+    background = np.bincount(pixels.ravel(), minlength=256).argmax()
+    ink = np.abs(pixels.astype(np.float32) - background)
+    if not ink.max():
+        return []
+    labels, _ = ndimage.label(ink > threshold * ink.max(), structure=np.ones((3, 3)))
+    glyphs = []
+    for k, (rows, cols) in enumerate(ndimage.find_objects(labels), 1):
+        crop = np.where(labels[rows, cols] == k, ink[rows, cols], 0)
+        glyphs.append(((cols.start, rows.start, cols.stop, rows.stop), crop))
+    return glyphs
+
+def split_touching(line, templates):
+    # Glyphs much wider than their neighbours are digits that touch after
+    # anti-aliasing. Try every cut near the expected split points and keep the
+    # one whose pieces best match the digit templates.
+    width = float(np.median([right - left for (left, _, right, _), _ in line]))
+    result = []
+    for (left, top, right, bottom), crop in line:
+        if round((right - left) / width) < 2:
+            result.append(((left, top, right, bottom), crop))
+            continue
+        pieces = []
+        while crop.shape[1] > 1.5 * width:
+            def score(cut):
+                return (glyph_vector(crop[:, :cut]) @ templates.T).max()
+            lo, hi = max(1, round(0.6 * width)), min(crop.shape[1] - 1, round(1.4 * width))
+            cut = max(range(lo, hi + 1), key=score) if lo <= hi else round(width)
+            pieces.append(((left, top, left + cut, bottom), crop[:, :cut]))
+            left, crop = left + cut, crop[:, cut:]
+        pieces.append(((left, top, right, bottom), crop))
+        result.extend(pieces)
+    return result
+
+def digit_templates():
+    # Digits rendered through the same pipeline at several font sizes.
+    from PIL import Image, ImageDraw, ImageFont
+    if not digit_template_cache:
+        vectors, labels = [], []
+        for size in (10, 14, 20, 28, 40, 60):
+            try:
+                font = ImageFont.load_default(size=size)
+            except TypeError:
+                font = ImageFont.load_default()  # Pillow < 10.1: bitmap font only
+            for digit in '0123456789':
+                img = Image.new('L', (4 * size + 8, 2 * size + 8), 0)
+                ImageDraw.Draw(img).text((4, 4), digit, fill=255, font=font)
+                glyphs = ink_glyphs(img)
+                if len(glyphs) == 1:
+                    vectors.append(glyph_vector(glyphs[0][1]))
+                    labels.append(digit)
+        digit_template_cache.extend([np.array(vectors), np.array(labels)])
+    return digit_template_cache
+
+def luhn_valid(number):
+    total = 0
+    for i, char in enumerate(reversed(number)):
+        digit = int(char)
+        if i % 2:
+            digit = digit * 2 - 9 if digit > 4 else digit * 2
+        total += digit
+    return total % 10 == 0
+
+def text_lines(glyphs):
+    # Group glyphs into lines by vertical overlap, each sorted left to right.
+    lines = []
+    for glyph in sorted(glyphs, key=lambda g: g[0][1]):
+        (left, top, right, bottom), _ = glyph
+        centre = (top + bottom) / 2
+        if lines and lines[-1][0] <= centre <= lines[-1][1]:
+            lines[-1][2].append(glyph)
+            lines[-1][1] = max(lines[-1][1], bottom)
+        else:
+            lines.append([top, bottom, [glyph]])
+    return [sorted(line[2], key=lambda g: g[0][0]) for line in lines]
+
+def read_digit_line(line, templates, labels):
+    # Returns (digits, confidence), or None unless the line holds 12-19 glyphs
+    # spaced in groups of four (the last group may be shorter).
+    line = split_touching(line, templates)
+    if not 12 <= len(line) <= 19:
+        return None
+    vectors = np.array([glyph_vector(crop) for _, crop in line])
+    similarity = vectors @ templates.T
+    digits, confidence = [], 1.0
+    for row in similarity:
+        best = row.argmax()
+        runner_up = row[labels != labels[best]].max()
+        digits.append(labels[best])
+        # A glyph nearly tied between two digits counts as unreadable.
+        confidence = min(confidence, float(row[best]) if row[best] - runner_up >= 0.05 else 0.0)
+    # The number is printed in groups of four, so the gaps after every fourth
+    # digit must be wider than all the others (measured between glyph centres,
+    # since narrow digits like 1 skew edge-to-edge gaps).
+    centres = [(left + right) / 2 for (left, _, right, _), _ in line]
+    pitches = np.diff(centres)
+    is_space = (np.arange(len(pitches)) % 4) == 3
+    if not is_space.any() or pitches[is_space].min() <= pitches[~is_space].max():
+        return None
+    return ''.join(digits), confidence
+
+def ocr_card_number(image_path, min_confidence=0.85):
+    # Returns (card_number, confidence); card_number is None when no line of
+    # 12-19 digits is read confidently with a valid Luhn checksum.
+    from PIL import Image
+    templates, labels = digit_templates()
+    with Image.open(image_path) as img:
+        gray = img.convert('L')
+    best = (None, 0.0)
+    for line in text_lines(ink_glyphs(gray)):
+        if len(line) < 6:
+            continue
+        result = read_digit_line(line, templates, labels)
+        if result is None:
+            continue
+        number, confidence = result
+        if confidence >= min_confidence and luhn_valid(number) and confidence > best[1]:
+            best = (number, confidence)
+    return best
+
+
+def ocr_card_directory(image_dir, output_file, workers=None, fallback=True):
+    # Batch mode: OCR every card image in image_dir across processes and write
+    # "image, card_number, source" rows; unreadable cards go to the LLM if allowed.
+    paths = sorted(os.path.join(image_dir, name) for name in os.listdir(image_dir)
+                   if name.lower().endswith(('.png', '.jpg', '.jpeg')))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(ocr_card_number, paths, chunksize=16))
+    with open(output_file, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.writer(out)
+        writer.writerow(['image', 'card_number', 'source'])
+        for path, (card_number, _) in zip(paths, results):
+            source = 'local'
+            if card_number is None and fallback:
+                content, _ = read_card_number(path)
+                card_number, source = re.sub(r'\D', '', content), 'llm'
+            writer.writerow([os.path.basename(path), card_number or '', source if card_number else 'none'])
+    return len(paths)
+
+
+def A8(filename='/data/credit_card.txt', image_path='/data/credit_card.png', preprocess=True, engine='auto'):
+    # engine: 'local' (template OCR only), 'llm' (vision model only) or 'auto'
+    # (local OCR, deferring to the model when unsure or the Luhn check fails).
+    if os.path.isdir(image_path):
+        return ocr_card_directory(image_path, filename, fallback=engine != 'local')
+
+    started = time.perf_counter()
+    card_number = None
+    if engine in ('auto', 'local'):
+        card_number, confidence = ocr_card_number(image_path)
+        if card_number is None and engine == 'local':
+            raise Exception(f"Could not read a card number from {image_path} locally")
+    if card_number is None:
+        content, stats = read_card_number(image_path, preprocess)
+        # Extract the card number, remove any spaces.
+        card_number = content.strip().replace(" ", "")
+        logging.getLogger(__name__).info(
+            "A8 uploaded %d of %d image bytes, %.3fs end to end",
+            stats["upload_bytes"], stats["original_bytes"], stats["latency"])
+    else:
+        logging.getLogger(__name__).info(
+            "A8 read the card locally (confidence %.2f) in %.3fs", confidence, time.perf_counter() - started)
+
     # Check that the result is exactly 16 digits.
     if len(card_number) != 16 or not card_number.isdigit():
         raise Exception(f"Transcribed card number '{card_number}' is not a valid 16-digit number")
-    
+
     with open(filename, 'w', encoding='utf-8') as file:
         file.write(card_number)
-    
+
     return card_number
 
 
-def get_embedding(text):
+# A9 embeddings: inputs are packed into batches under the API's count and
+# token limits and the batches are sent concurrently over one pooled client.
+import asyncio
+import random
+
+embedding_api_url = "https://aiproxy.sanand.workers.dev/openai/v1/embeddings"
+
+def embedding_batches(texts, max_items=2048, max_tokens=250_000):
+    # Yield (start, texts) slices. Tokens are estimated at ~4 characters each.
+    start, tokens = 0, 0
+    for i, text in enumerate(texts):
+        estimate = len(text) // 4 + 1
+        if i > start and (i - start >= max_items or tokens + estimate > max_tokens):
+            yield start, texts[start:i]
+            start, tokens = i, 0
+        tokens += estimate
+    if start < len(texts):
+        yield start, texts[start:]
+
+async def post_embedding_batch(client, semaphore, batch, model, retries):
+    async with semaphore:
+        for attempt in range(retries + 1):
+            try:
+                response = await client.post(embedding_api_url, json={"model": model, "input": batch})
+                if response.status_code != 429 and response.status_code < 500:
+                    response.raise_for_status()
+                    result = response.json()
+                    if "data" not in result:
+                        raise Exception("Response JSON does not contain 'data': " + json.dumps(result))
+                    # The API may return items out of order; 'index' is authoritative.
+                    return np.asarray([item["embedding"] for item in sorted(result["data"], key=lambda item: item["index"])],
+                                      dtype=np.float32)
+                retry_after = response.headers.get("retry-after")
+                error = Exception(f"Embeddings API returned HTTP {response.status_code}")
+            except httpx.TransportError as e:
+                retry_after, error = None, e
+            if attempt == retries:
+                raise error
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else min(30, 2 ** attempt) * (0.5 + random.random())
+            await asyncio.sleep(delay)
+
+async def fetch_embeddings(texts, model, concurrency, retries):
     api_key = os.getenv("AIPROXY_TOKEN")
     if not api_key:
         raise Exception("AIPROXY_TOKEN not set")
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "text-embedding-3-small",  # or the model you intend to use
-        "input": text
-    }
-    response = https.post("https://aiproxy.sanand.workers.dev/openai/v1/embeddings", headers=headers, json=data)
-    response.raise_for_status()  # Will raise an HTTPError if status is 4xx or 5xx
-    result = response.json()
-    if "data" not in result:
-        raise Exception("Response JSON does not contain 'data': " + json.dumps(result))
-    # Extract the embedding (assuming the response data is a list with at least one element)
-    embedding = result["data"][0]["embedding"]
-    return embedding
+    headers = {"Authorization": f"Bearer {api_key}"}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    embeddings = None
+
+    async def fetch_into(client, start, batch):
+        # Each batch goes into the float32 result as soon as it arrives.
+        nonlocal embeddings
+        vectors = await post_embedding_batch(client, semaphore, batch, model, retries)
+        if embeddings is None:
+            embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+        embeddings[start:start + len(batch)] = vectors
+
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=60) as client:
+        await asyncio.gather(*(fetch_into(client, start, batch) for start, batch in embedding_batches(texts)))
+    return embeddings
+
+def run_async(coro):
+    # Run a coroutine from sync code, even when called inside FastAPI's event loop.
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+def get_embeddings(texts, model="text-embedding-3-small", concurrency=4, retries=5):
+    # float32 matrix of embeddings for texts, in input order.
+    if not texts:
+        return []
+    return run_async(fetch_embeddings(list(texts), model, concurrency, retries))
+
+def get_embedding(text):
+    return get_embeddings([text])[0]
+
+# Local embeddings: signed feature hashing of character 3-5-grams with
+# sublinear term frequency, L2-normalized. There is no fitted state (no IDF),
+# so a text always gets the same vector and caches like a remote embedding.
+# The model name carries the dimension, e.g. local-ngram-512.
+def ngram_hashes(data, size):
+    # Mixed 64-bit polynomial hash of every size-byte window of a uint8 array.
+    windows = np.lib.stride_tricks.sliding_window_view(data, size)
+    hashes = (windows.astype(np.uint64) * (np.uint64(257) ** np.arange(size, dtype=np.uint64))).sum(axis=1)
+    return hashes * np.uint64(0x9E3779B97F4A7C15)
+
+def local_embeddings(texts, model="local-ngram-512", sizes=(3, 4, 5), batch_size=4096):
+    dim = int(model.rsplit('-', 1)[1])
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for start in range(0, len(texts), batch_size):
+        # One buffer per batch; windows spanning two texts are dropped.
+        batch = [f" {' '.join(text.lower().split())} ".encode('utf-8') for text in texts[start:start + batch_size]]
+        data = np.frombuffer(b''.join(batch), dtype=np.uint8)
+        owner = np.repeat(np.arange(len(batch)), [len(text) for text in batch])
+        counts = np.zeros(len(batch) * dim)
+        for size in sizes:
+            if len(data) < size:
+                continue
+            hashes = ngram_hashes(data, size)
+            inside = owner[:len(hashes)] == owner[size - 1:]
+            hashes = hashes[inside]
+            buckets = ((hashes >> np.uint64(32)) % np.uint64(dim)).astype(np.int64)
+            signs = np.where(hashes & np.uint64(1 << 31), -1.0, 1.0)
+            counts += np.bincount(owner[:len(inside)][inside] * dim + buckets, weights=signs, minlength=len(counts))
+        block = counts.reshape(len(batch), dim)
+        block = np.sign(block) * np.log1p(np.abs(block))
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        vectors[start:start + len(batch)] = block / np.where(norms == 0, 1, norms)
+    return vectors
+
+# name -> (default model, function(texts, model=...) returning one vector per text)
+embedding_backends = {
+    'remote': ("text-embedding-3-small", get_embeddings),
+    'local': ("local-ngram-512", local_embeddings),
+}
+
+def embedding_backend(backend=None, model=None):
+    # (model, embed function) for backend, else $EMBEDDING_BACKEND, else remote.
+    name = backend or os.getenv("EMBEDDING_BACKEND", "remote")
+    if name not in embedding_backends:
+        raise ValueError(f"Unknown embedding backend {name!r}; expected one of {sorted(embedding_backends)}")
+    default_model, embed = embedding_backends[name]
+    return model or default_model, embed
+
+# Persistent embedding store. Per model directory:
+#   vectors.bin  row-major matrix (float32, float16, or int8 with scales.bin)
+#   index.bin    append-only (16-byte key, uint64 row) records
+#   meta.json    dim, dtype and a generation bumped by every compaction
+# The key is sha256(model, text), writers append under an exclusive flock,
+# and readers memory-map the matrix and pick up new index records lazily.
+import fcntl
+import struct
+
+index_record = struct.Struct('<16sQ')
+
+class EmbeddingStore:
+    def __init__(self, root=None, model="text-embedding-3-small", dtype='float32', fetch=None):
+        root = root or os.getenv("EMBEDDING_STORE", "/data/.embeddings")
+        self.path = os.path.join(root, re.sub(r'[^\w.-]', '_', model))
+        self.model = model
+        self.fetch = fetch or get_embeddings
+        self.dtype = np.dtype(dtype)
+        self.hits = self.misses = 0
+        os.makedirs(self.path, exist_ok=True)
+        self.meta = None
+        self.reload()
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    def lock(self, exclusive=True):
+        handle = open(self.file('lock'), 'a')
+        fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        return handle
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model}\0{text}".encode('utf-8')).digest()[:16]
+
+    def reload(self):
+        # (Re)read meta.json and the whole index, e.g. after another process compacted.
+        try:
+            with open(self.file('meta.json')) as f:
+                self.meta = json.load(f)
+            self.dtype = np.dtype(self.meta['dtype'])
+        except FileNotFoundError:
+            self.meta = None
+        self.rows, self.index_offset = {}, 0
+        self.vectors = self.scales = None
+        self.read_index()
+
+    def read_index(self):
+        # Pick up records appended since the last read.
+        try:
+            with open(self.file('index.bin'), 'rb') as f:
+                f.seek(self.index_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        usable = len(data) - len(data) % index_record.size
+        for key, row in index_record.iter_unpack(data[:usable]):
+            self.rows.setdefault(key, row)
+        self.index_offset += usable
+
+    def matrix(self, needed_rows):
+        # Memory-mapped vectors, remapped when they have grown past needed_rows.
+        if self.vectors is None or len(self.vectors) < needed_rows:
+            row_count = os.path.getsize(self.file('vectors.bin')) // (self.meta['dim'] * self.dtype.itemsize)
+            self.vectors = np.memmap(self.file('vectors.bin'), dtype=self.dtype, mode='r', shape=(row_count, self.meta['dim']))
+            if self.dtype == np.int8:
+                self.scales = np.memmap(self.file('scales.bin'), dtype=np.float32, mode='r', shape=(row_count,))
+        return self.vectors
+
+    def check_generation(self):
+        try:
+            with open(self.file('meta.json')) as f:
+                generation = json.load(f)['generation']
+        except FileNotFoundError:
+            return
+        if self.meta is None or generation != self.meta['generation']:
+            self.reload()
+
+    def lookup(self, texts):
+        # Row numbers for texts (None where missing).
+        self.check_generation()
+        keys = [self.key(text) for text in texts]
+        if any(key not in self.rows for key in keys):
+            self.read_index()
+        found = [self.rows.get(key) for key in keys]
+        hits = sum(row is not None for row in found)
+        self.hits += hits
+        self.misses += len(found) - hits
+        return found
+
+    def vector(self, row):
+        # Zero-copy view for float32 stores; float16/int8 rows are decoded.
+        vectors = self.matrix(row + 1)
+        if self.dtype == np.int8:
+            return vectors[row].astype(np.float32) * self.scales[row]
+        return vectors[row] if self.dtype == np.float32 else vectors[row].astype(np.float32)
+
+    def vectors_for(self, rows):
+        vectors = self.matrix(max(rows) + 1)
+        result = np.asarray(vectors[rows], dtype=np.float32)
+        if self.dtype == np.int8:
+            result *= self.scales[rows][:, None]
+        return result
+
+    def encode(self, vectors, dtype=None):
+        dtype = np.dtype(dtype or self.dtype)
+        if dtype == np.int8:
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1
+            return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return vectors.astype(dtype), None
+
+    def put(self, texts, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self.lock():
+            self.check_generation()
+            if self.meta is None:
+                self.meta = {'model': self.model, 'dim': int(vectors.shape[1]), 'dtype': self.dtype.name, 'generation': 0}
+                write_json_atomic(self.file('meta.json'), self.meta)
+            if vectors.shape[1] != self.meta['dim']:
+                raise ValueError(f"Expected {self.meta['dim']}-dimensional vectors, got {vectors.shape[1]}")
+            row_bytes = self.meta['dim'] * self.dtype.itemsize
+            encoded, scales = self.encode(vectors)
+            # Vectors first, then the index records that point at them, so a
+            # reader never sees a row that has not been written yet.
+            with open(self.file('vectors.bin'), 'ab') as f:
+                first_row = f.tell() // row_bytes
+                f.write(encoded.tobytes())
+            if scales is not None:
+                with open(self.file('scales.bin'), 'ab') as f:
+                    f.write(scales.tobytes())
+            with open(self.file('index.bin'), 'ab') as f:
+                f.write(b''.join(index_record.pack(self.key(text), first_row + i) for i, text in enumerate(texts)))
+
+    def embed(self, texts, fetch=None, lazy=False):
+        # float32 matrix for texts; only the misses are fetched (deduplicated).
+        # lazy returns a StoreRows view that decodes rows as they are sliced.
+        fetch = fetch or (lambda missing: self.fetch(missing, model=self.model))
+        rows = self.lookup(texts)
+        missing = list(dict.fromkeys(text for text, row in zip(texts, rows) if row is None))
+        if missing:
+            self.put(missing, fetch(missing))
+            self.read_index()
+            rows = [self.rows[self.key(text)] for text in texts]
+        if lazy:
+            return StoreRows(self, rows)
+        return self.vectors_for(rows) if rows else np.zeros((0, 0), dtype=np.float32)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'entries': len(self.rows), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0}
+
+    def compact(self, keep=None, dtype=None):
+        # Rewrite the store without duplicate rows (and, if keep is given, only
+        # the given texts), optionally converting to another dtype.
+        with self.lock():
+            self.reload()
+            if self.meta is None:
+                return
+            keys = list(self.rows) if keep is None else [k for k in map(self.key, keep) if k in self.rows]
+            rows = [self.rows[k] for k in keys]
+            target = np.dtype(dtype or self.dtype)
+            with open(self.file('vectors.bin.tmp'), 'wb') as out, open(self.file('scales.bin.tmp'), 'wb') as out_scales:
+                for start in range(0, len(rows), 65536):
+                    encoded, scales = self.encode(self.vectors_for(rows[start:start + 65536]), target)
+                    out.write(encoded.tobytes())
+                    if scales is not None:
+                        out_scales.write(scales.tobytes())
+            with open(self.file('index.bin.tmp'), 'wb') as f:
+                f.write(b''.join(index_record.pack(key, row) for row, key in enumerate(keys)))
+            os.replace(self.file('scales.bin.tmp'), self.file('scales.bin'))
+            os.replace(self.file('vectors.bin.tmp'), self.file('vectors.bin'))
+            os.replace(self.file('index.bin.tmp'), self.file('index.bin'))
+            self.meta.update(dtype=target.name, generation=self.meta['generation'] + 1)
+            write_json_atomic(self.file('meta.json'), self.meta)
+            self.reload()
+
+class StoreRows:
+    # Read-only matrix view of some store rows, backed by the memory map:
+    # indexing with an int or a slice decodes just those rows to float32, so
+    # blocked searches never hold more than a block in memory.
+    def __init__(self, store, rows):
+        self.store = store
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.shape = (len(self.rows), store.meta['dim'])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            rows = self.rows[index]
+            return self.store.vectors_for(rows) if len(rows) else np.zeros((0, self.shape[1]), dtype=np.float32)
+        return self.store.vector(int(self.rows[index]))
+
+embedding_stores = {}
+
+def embedding_store(model=None, root=None, backend=None):
+    model, fetch = embedding_backend(backend, model)
+    key = (root, model)
+    if key not in embedding_stores:
+        embedding_stores[key] = EmbeddingStore(root, model, fetch=fetch)
+    return embedding_stores[key]
+
+def cached_embeddings(texts, model=None, root=None, backend=None, lazy=False):
+    # Embeddings through the shared on-disk store; warm runs make no API calls.
+    return embedding_store(model, root, backend).embed(list(texts), lazy=lazy)
+
+# A9 similarity: rows are normalized block by block and compared with tiled
+# matrix products, so memory stays at O(block_size^2) however many comments
+# there are. A small heap keeps the running top-k pairs.
+def row_norms(embeddings, block_size):
+    return np.concatenate([np.linalg.norm(np.asarray(embeddings[i:i + block_size], dtype=np.float64), axis=1)
+                           for i in range(0, len(embeddings), block_size)])
+
+def normalized_block(embeddings, norms, start, stop, dtype):
+    block = np.asarray(embeddings[start:stop], dtype=dtype)
+    scale = norms[start:stop].astype(dtype)
+    # Zero vectors stay zero: similarity 0, i.e. cosine distance 1.
+    return block / np.where(scale == 0, 1, scale)[:, None]
+
+def push_top_pairs(heap, k, similarity, row_ids, col_ids):
+    # Merge a block of pair similarities into heap, a min-heap of the k best
+    # (similarity, -i, -j) with i < j; -inf entries are masked-out pairs.
+    flat = similarity.ravel()
+    m = min(k, flat.size)
+    threshold = np.partition(flat, -m)[-m]
+    if len(heap) == k:
+        threshold = max(threshold, heap[0][0])
+    for index in np.flatnonzero(flat >= threshold):
+        if flat[index] == -np.inf:
+            continue
+        r, c = divmod(int(index), similarity.shape[1])
+        i, j = sorted((int(row_ids[r]), int(col_ids[c])))
+        item = (float(flat[index]), -i, -j)
+        if len(heap) < k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+def blocked_top_pairs(embeddings, norms, k, block_size, dtype):
+    # [(similarity, i, j)] for the k most similar pairs i < j, highest first;
+    # ties go to the smallest (i, j), like a nested i < j loop with a strict <.
+    heap = []
+    n = len(embeddings)
+    for row_start in range(0, n, block_size):
+        row_stop = min(n, row_start + block_size)
+        rows = normalized_block(embeddings, norms, row_start, row_stop, dtype)
+        for col_start in range(row_start, n, block_size):
+            col_stop = min(n, col_start + block_size)
+            cols = normalized_block(embeddings, norms, col_start, col_stop, dtype)
+            similarity = rows @ cols.T
+            if col_start == row_start:
+                similarity[np.tril_indices(len(rows), 0, len(cols))] = -np.inf
+            push_top_pairs(heap, k, similarity, range(row_start, row_stop), range(col_start, col_stop))
+    return [(similarity, -i, -j) for similarity, i, j in sorted(heap, reverse=True)]
 
 def cosine(vec1, vec2):
-    # Compute cosine similarity between two numpy arrays.
-    vec1 = np.array(vec1)
-    vec2 = np.array(vec2)
-    dot = np.dot(vec1, vec2)
+    # Cosine distance between two vectors; 1.0 when either is all zeros.
+    vec1 = np.asarray(vec1)
+    vec2 = np.asarray(vec2)
     norm1 = np.linalg.norm(vec1)
     norm2 = np.linalg.norm(vec2)
     if norm1 == 0 or norm2 == 0:
         return 1.0
-    return 1 - dot / (norm1 * norm2)
+    return 1 - np.dot(vec1, vec2) / (norm1 * norm2)
+
+def top_similar_pairs(embeddings, k=1, block_size=2048, approximate=False, projection_dim=128, oversample=4, rescore_extra=32):
+    # [(similarity, i, j)] for the k most similar pairs, highest first.
+    # Exact mode searches in float64; approximate mode searches float32 random
+    # projections for k * oversample candidates. Either way the candidates (plus
+    # rescore_extra more, to catch near-ties) are re-ranked with the per-pair
+    # cosine(), so k=1 returns exactly the pair a nested i < j loop would.
+    norms = row_norms(embeddings, block_size)
+    dim = np.shape(embeddings)[1]
+    if approximate and dim > projection_dim:
+        projection = np.random.default_rng(0).standard_normal((dim, projection_dim)).astype(np.float32)
+        projected = np.concatenate([normalized_block(embeddings, norms, i, i + block_size, np.float32) @ projection
+                                    for i in range(0, len(embeddings), block_size)])
+        candidates = blocked_top_pairs(projected, row_norms(projected, block_size), k * oversample + rescore_extra, block_size, np.float32)
+    else:
+        candidates = blocked_top_pairs(embeddings, norms, k + rescore_extra, block_size, np.float64)
+    rescored = sorted((cosine(embeddings[i], embeddings[j]), i, j) for _, i, j in candidates)
+    return [(1 - distance, i, j) for distance, i, j in rescored[:k]]
 
-def A9(filename='/data/comments.txt', output_filename='/data/comments-similar.txt'):
+# A9 at corpus scale: an IVF-PQ index persisted inside the embedding store.
+#   ann/ann.json       nlist, m, trained/indexed row counts, store generation
+#   ann/centroids.npy  coarse centroids (spherical k-means over unit vectors)
+#   ann/codebooks.npy  (m, ksub, dim / m) product-quantizer codebooks
+#   ann/lists.bin      int32 coarse list per store row
+#   ann/codes.bin      m uint8 PQ codes per store row
+# update() only encodes rows appended since the last call; a store compaction,
+# or the store outgrowing the training sample by retrain_factor, retrains.
+# Searches probe the nprobe nearest lists, rank candidates by PQ inner product
+# and re-rank the best rerank * k exactly. Pair and cluster queries compare
+# each list with the lists whose centroids are among its nprobe nearest.
+def nearest_centroids(data, centroids, spherical=False, block_size=16384):
+    # Index of the closest centroid for every row of data.
+    bias = 0 if spherical else 0.5 * (centroids ** 2).sum(axis=1)
+    return np.concatenate([np.argmax(data[i:i + block_size] @ centroids.T - bias, axis=1)
+                           for i in range(0, len(data), block_size)])
+
+def kmeans(data, k, iterations=10, spherical=False, seed=0):
+    # Lloyd's k-means; spherical compares by dot product and keeps centroids
+    # unit length. Empty clusters keep their previous centroid.
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = nearest_centroids(data, centroids, spherical)
+        order = np.argsort(labels, kind='stable')
+        present, starts = np.unique(labels[order], return_index=True)
+        counts = np.diff(np.append(starts, len(data)))
+        centroids[present] = np.add.reduceat(data[order], starts, axis=0) / counts[:, None]
+        if spherical:
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+def top_indices(values, n):
+    # Positions of the n largest values, largest first.
+    if n < len(values):
+        picked = np.argpartition(-values, n - 1)[:n]
+    else:
+        picked = np.arange(len(values))
+    return picked[np.argsort(-values[picked], kind='stable')]
+
+class EmbeddingIndex:
+    def __init__(self, store, nlist=None, m=16, nprobe=8, rerank=4, train_size=20000, retrain_factor=4):
+        self.store = store
+        self.path = store.file('ann')
+        self.nlist = nlist
+        self.m = m
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.train_size = train_size
+        self.retrain_factor = retrain_factor
+        self.meta = self.inverted = None
+        os.makedirs(self.path, exist_ok=True)
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    def load(self):
+        try:
+            with open(self.file('ann.json')) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            self.meta = None
+            return
+        if meta != self.meta:
+            self.meta = meta
+            self.centroids = np.load(self.file('centroids.npy'))
+            self.codebooks = np.load(self.file('codebooks.npy'))
+            self.inverted = None
+
+    def unit_rows(self, rows):
+        vectors = self.store.vectors_for(rows)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def pq_encode(self, unit):
+        return np.stack([nearest_centroids(np.ascontiguousarray(part), codebook)
+                         for part, codebook in zip(np.split(unit, self.meta['m'], axis=1), self.codebooks)], axis=1).astype(np.uint8)
+
+    def train(self, row_count):
+        sample_rows = np.sort(np.random.default_rng(0).choice(row_count, min(row_count, self.train_size), replace=False))
+        sample = self.unit_rows(sample_rows)
+        dim = sample.shape[1]
+        nlist = self.nlist or max(1, min(int(4 * math.sqrt(row_count)), len(sample) // 39))
+        m = max(d for d in range(1, self.m + 1) if dim % d == 0)
+        self.centroids = kmeans(sample, min(nlist, len(sample)), spherical=True)
+        self.codebooks = np.stack([kmeans(np.ascontiguousarray(part), min(256, len(sample)))
+                                   for part in np.split(sample, m, axis=1)])
+        save_array_atomic(self.file('centroids.npy'), self.centroids)
+        save_array_atomic(self.file('codebooks.npy'), self.codebooks)
+        self.meta = {'nlist': len(self.centroids), 'm': m, 'dim': dim, 'trained_rows': row_count,
+                     'indexed_rows': 0, 'generation': self.store.meta['generation']}
+        write_json_atomic(self.file('ann.json'), self.meta)
+        self.inverted = None
+
+    def update(self, chunk_size=65536):
+        # Index the store rows appended since the last update; returns how many.
+        with self.store.lock():
+            self.store.check_generation()
+            if self.store.meta is None:
+                return 0
+            row_bytes = self.store.meta['dim'] * self.store.dtype.itemsize
+            row_count = os.path.getsize(self.store.file('vectors.bin')) // row_bytes
+            self.load()
+            if (self.meta is None or self.meta['generation'] != self.store.meta['generation']
+                    or row_count > self.retrain_factor * self.meta['trained_rows']):
+                self.train(row_count)
+            start = self.meta['indexed_rows']
+            # Drop whatever a crashed update appended past indexed_rows.
+            for name, width in (('lists.bin', 4), ('codes.bin', self.meta['m'])):
+                with open(self.file(name), 'ab') as f:
+                    f.truncate(start * width)
+            for chunk in range(start, row_count, chunk_size):
+                unit = self.unit_rows(np.arange(chunk, min(row_count, chunk + chunk_size)))
+                with open(self.file('lists.bin'), 'ab') as f:
+                    f.write(nearest_centroids(unit, self.centroids, spherical=True).astype(np.int32).tobytes())
+                with open(self.file('codes.bin'), 'ab') as f:
+                    f.write(self.pq_encode(unit).tobytes())
+            if row_count > start:
+                self.meta['indexed_rows'] = row_count
+                write_json_atomic(self.file('ann.json'), self.meta)
+                self.inverted = None
+            return row_count - start
+
+    def inverted_lists(self):
+        # (rows ordered by list, list offsets into it, PQ codes by row)
+        self.load()
+        if self.meta is None:
+            raise Exception(f"No embedding index in {self.path}; call update() first")
+        if self.inverted is None:
+            n = self.meta['indexed_rows']
+            lists = np.fromfile(self.file('lists.bin'), dtype=np.int32, count=n)
+            codes = np.fromfile(self.file('codes.bin'), dtype=np.uint8, count=n * self.meta['m']).reshape(n, self.meta['m'])
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=self.meta['nlist']))])
+            self.inverted = (np.argsort(lists, kind='stable'), offsets, codes)
+        return self.inverted
+
+    def search(self, queries, k=10, nprobe=None, rerank=None):
+        # [[(similarity, row)]]: the k nearest store rows of each query vector.
+        order, offsets, codes = self.inverted_lists()
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe or self.nprobe]
+        m = self.meta['m']
+        results = []
+        for query, probe in zip(queries, probes):
+            candidates = np.concatenate([order[offsets[l]:offsets[l + 1]] for l in probe])
+            tables = np.einsum('msd,md->ms', self.codebooks, query.reshape(m, -1))
+            approx = tables[np.arange(m), codes[candidates]].sum(axis=1)
+            keep = np.sort(candidates[top_indices(approx, k * (rerank or self.rerank))])
+            exact = self.unit_rows(keep) @ query if len(keep) else approx[:0]
+            results.append([(float(exact[i]), int(keep[i])) for i in top_indices(exact, k)])
+        return results
+
+    def neighbors(self, rows, k=10, nprobe=None, rerank=None):
+        # The k nearest other rows of each given store row.
+        hits = self.search(self.store.vectors_for(rows), k + 1, nprobe, rerank)
+        return [[hit for hit in found if hit[1] != row][:k] for row, found in zip(rows, hits)]
+
+    def candidate_blocks(self, nprobe=None, rows=None, block_size=2048):
+        # (left rows, right rows, similarities) covering every candidate pair
+        # once; pairs within a list are masked to the upper triangle.
+        order, offsets, _ = self.inverted_lists()
+        allowed = None
+        if rows is not None:
+            allowed = np.zeros(self.meta['indexed_rows'], dtype=bool)
+            allowed[[row for row in rows if row < len(allowed)]] = True
+        def members(l):
+            found = order[offsets[l]:offsets[l + 1]]
+            return np.sort(found if allowed is None else found[allowed[found]])
+        partners = {}
+        probes = np.argsort(-(self.centroids @ self.centroids.T), axis=1)[:, :nprobe or self.nprobe]
+        for a, probe in enumerate(probes):
+            for b in [a, *probe.tolist()]:
+                partners.setdefault(min(a, b), set()).add(max(a, b))
+        for a in sorted(partners):
+            left = members(a)
+            if not len(left):
+                continue
+            left_unit = self.unit_rows(left)
+            for b in sorted(partners[a]):
+                right = left if b == a else members(b)
+                for start in range(0, len(right), block_size):
+                    cols = right[start:start + block_size]
+                    similarity = left_unit @ self.unit_rows(cols).T
+                    if b == a:
+                        similarity[left[:, None] >= cols[None, :]] = -np.inf
+                    yield left, cols, similarity
+
+    def similar_pairs(self, k=1, nprobe=None, rows=None, rescore_extra=32):
+        # [(similarity, i, j)] for the k most similar candidate pairs of rows.
+        heap = []
+        for left, cols, similarity in self.candidate_blocks(nprobe, rows):
+            push_top_pairs(heap, k + rescore_extra, similarity, left, cols)
+        rescored = sorted((cosine(self.store.vector(-i), self.store.vector(-j)), -i, -j) for _, i, j in heap)
+        return [(1 - distance, i, j) for distance, i, j in rescored[:k]]
+
+    def near_duplicates(self, threshold=0.95, nprobe=None, rows=None):
+        # Groups of rows linked by cosine similarity >= threshold, as sorted lists.
+        parent = {}
+        def find(row):
+            while parent.get(row, row) != row:
+                row = parent[row]
+            return row
+        for left, cols, similarity in self.candidate_blocks(nprobe, rows):
+            for r, c in zip(*np.nonzero(similarity >= threshold)):
+                a, b = find(int(left[r])), find(int(cols[c]))
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+        groups = {}
+        for row in parent:
+            root = find(row)
+            groups.setdefault(root, {root}).add(row)
+        return sorted(sorted(group) for group in groups.values())
+
+embedding_indexes = {}
+
+def embedding_index(store):
+    if store.path not in embedding_indexes:
+        embedding_indexes[store.path] = EmbeddingIndex(store)
+    return embedding_indexes[store.path]
+
+# A9 without embeddings: MinHash LSH over character shingles. Workers read
+# line-aligned byte ranges of the comments file and return each comment's
+# offset and per-band hashes of its MinHash signature; comments sharing any
+# band bucket are candidates, verified by exact shingle Jaccard similarity.
+mersenne_prime = np.uint64((1 << 61) - 1)
+
+def shingle_hashes(text, size=5):
+    # Sorted unique 32-bit hashes of the text's character (UTF-8 byte) shingles.
+    data = np.frombuffer(' '.join(text.lower().split()).encode('utf-8'), dtype=np.uint8)
+    return np.unique(ngram_hashes(data, max(1, min(size, len(data)))) >> np.uint64(32))
+
+def lsh_bands(num_perm, threshold):
+    # (bands, rows per band) whose S-curve midpoint (1/bands)^(1/rows) is closest to threshold.
+    return min(((num_perm // r, r) for r in range(1, num_perm + 1)), key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+def comment_band_hashes(path, start, end, num_perm, bands, rows, shingle_size, seed):
+    # (offsets, band hashes) for the non-empty lines starting in [start, end).
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+    mix = rng.integers(1, 1 << 63, rows, dtype=np.uint64)
+    offsets, signatures = [], []
+    with open(path, 'rb') as f:
+        if start:
+            f.seek(start - 1)
+            if f.read(1) != b'\n':
+                f.readline()
+        while f.tell() < end:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            text = line.decode('utf-8').strip()
+            if text:
+                shingles = shingle_hashes(text, shingle_size)
+                offsets.append(offset)
+                signatures.append(((np.outer(shingles, a) + b) % mersenne_prime).min(axis=0))
+    if not offsets:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, bands), dtype=np.uint64)
+    banded = np.stack(signatures)[:, :bands * rows].reshape(len(offsets), bands, rows)
+    return np.array(offsets, dtype=np.int64), (banded * mix).sum(axis=2)
+
+def read_comment(path, offset):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.readline().decode('utf-8').strip()
+
+def minhash_similar_pairs(filename, k=1, threshold=0.5, num_perm=128, shingle_size=5, workers=None,
+                          chunk_bytes=8 * 1024 * 1024, max_bucket=1000, seed=1):
+    # [(jaccard, first comment, second comment)] for the k most similar
+    # candidate pairs, in file order within a pair. Buckets larger than
+    # max_bucket are chained rather than paired all-against-all.
+    bands, rows = lsh_bands(num_perm, threshold)
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(filename)
+    offsets, keys = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for start in range(0, size, chunk_bytes):
+            in_flight.append(pool.submit(comment_band_hashes, filename, start, min(start + chunk_bytes, size),
+                                         num_perm, bands, rows, shingle_size, seed))
+            if len(in_flight) >= 2 * workers:
+                chunk_offsets, chunk_keys = in_flight.popleft().result()
+                offsets.append(chunk_offsets)
+                keys.append(chunk_keys)
+        while in_flight:
+            chunk_offsets, chunk_keys = in_flight.popleft().result()
+            offsets.append(chunk_offsets)
+            keys.append(chunk_keys)
+    offsets = np.concatenate(offsets) if offsets else np.zeros(0, dtype=np.int64)
+    if len(offsets) < 2:
+        raise Exception(f"Need at least two comments in {filename}")
+    keys = np.concatenate(keys)
+
+    candidates = set()
+    for band in keys.T:
+        order = np.argsort(band, kind='stable')
+        sorted_keys = band[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        for bucket in np.split(order, starts[1:]):
+            if len(bucket) < 2:
+                continue
+            members = np.sort(bucket).tolist()
+            if len(members) > max_bucket:
+                candidates.update(zip(members, members[1:]))
+            else:
+                candidates.update((members[x], members[y]) for x in range(len(members)) for y in range(x + 1, len(members)))
+
+    shingles = {}
+    def comment_shingles(i):
+        if i not in shingles:
+            shingles[i] = shingle_hashes(read_comment(filename, offsets[i]), shingle_size)
+        return shingles[i]
+    scored = []
+    for i, j in candidates:
+        first, second = comment_shingles(i), comment_shingles(j)
+        common = len(np.intersect1d(first, second, assume_unique=True))
+        scored.append((-common / (len(first) + len(second) - common), i, j))
+    return [(-score, read_comment(filename, offsets[i]), read_comment(filename, offsets[j]))
+            for score, i, j in heapq.nsmallest(k, scored)]
+
+def embedding_similar_pairs(filename, use_store=True, k=1, approximate=False, ann=False, nprobe=8, backend=None):
     # Read comments
     with open(filename, 'r', encoding="utf-8") as f:
         comments = [line.strip() for line in f.readlines() if line.strip()]
-    
-    # Get embeddings for all comments
-    embeddings = [get_embedding(comment) for comment in comments]
-    
-    # Find the most similar pair (lowest cosine distance)
-    min_distance = float('inf')
-    most_similar = (None, None)
-    
-    for i in range(len(comments)):
-        for j in range(i + 1, len(comments)):
-            distance = cosine(embeddings[i], embeddings[j])
-            if distance < min_distance:
-                min_distance = distance
-                most_similar = (comments[i], comments[j])
-    
-    # Write the most similar pair to file
+    if len(comments) < 2:
+        raise Exception(f"Need at least two comments in {filename}")
+
+    if ann:
+        # Index the whole store once, then search only this file's rows.
+        # Repeated comments are exact matches the index never pairs, so they go first.
+        store = embedding_store(backend=backend)
+        store.embed(comments)
+        index = embedding_index(store)
+        index.update()
+        first_seen, found = {}, []
+        for i, row in enumerate(store.lookup(comments)):
+            if row in first_seen:
+                found.append((first_seen[row], i))
+            first_seen.setdefault(row, i)
+        found += [(first_seen[i], first_seen[j]) for _, i, j in index.similar_pairs(k, nprobe, rows=list(first_seen))]
+        pairs = [(comments[i], comments[j]) for i, j in found[:k]]
+    else:
+        # Get embeddings for all comments, batched and cached on disk; the
+        # store's rows are searched in place rather than copied into one matrix.
+        if use_store:
+            embeddings = cached_embeddings(comments, backend=backend, lazy=True)
+        else:
+            model, embed = embedding_backend(backend)
+            embeddings = embed(comments, model=model)
+
+        # Find the k most similar pairs (lowest cosine distance)
+        pairs = [(comments[i], comments[j]) for _, i, j in top_similar_pairs(embeddings, k=k, approximate=approximate)]
+
+    return pairs
+
+def A9(filename='/data/comments.txt', output_filename='/data/comments-similar.txt', use_store=True, k=1, approximate=False, ann=False, nprobe=8, minhash=False, threshold=0.5, backend=None):
+    if minhash:
+        # Near-duplicate text: the file is streamed, no embeddings and no network
+        pairs = [(first, second) for _, first, second in minhash_similar_pairs(filename, k=k, threshold=threshold)]
+        if not pairs:
+            raise Exception(f"No near-duplicate comments found in {filename}")
+    else:
+        pairs = embedding_similar_pairs(filename, use_store, k, approximate, ann, nprobe, backend)
+
+    # Write the pairs to file, one comment per line and a blank line between pairs
     with open(output_filename, 'w', encoding="utf-8") as f:
-        f.write(most_similar[0] + '\n')
-        f.write(most_similar[1] + '\n')
-    
-    return most_similar
+        f.write('\n'.join(f"{first}\n{second}\n" for first, second in pairs))
 
-def A10(filename='/data/ticket-sales.db', output_filename='/data/ticket-sales-gold.txt', query="SELECT SUM(units * price) FROM tickets WHERE type = 'Gold'"):
-    # Connect to the SQLite database
-    conn = sqlite3.connect(filename)
-    cursor = conn.cursor()
+    return pairs[0] if k == 1 else pairs
+
+# A10/B5 SQLite access: a small pool of read-only connections per database
+# file, so the page cache, mmap and each connection's prepared-statement cache
+# survive between calls. Databases without a -wal/-journal file are opened
+# immutable (no locking or change checks inside SQLite); instead the pool
+# compares the file's (inode, size, mtime) on every checkout and drops its
+# connections when the database changes.
+from contextlib import contextmanager
+from urllib.parse import quote
+
+class SQLitePool:
+    def __init__(self, path, size=4, mmap_size=256 * 1024 * 1024, cache_kib=64 * 1024, statements=256):
+        self.path = path
+        self.size = size
+        self.mmap_size = mmap_size
+        self.cache_kib = cache_kib
+        self.statements = statements
+        self.lock = threading.Lock()
+        self.idle = []
+        self.version = None
+
+    def fingerprint(self):
+        parts = []
+        for path in (self.path, f"{self.path}-wal"):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            parts.append((st.st_ino, st.st_size, st.st_mtime_ns))
+        # The header's file change counter also catches same-size writes
+        # landing within the filesystem's mtime granularity.
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(24)
+                parts.append(f.read(4))
+        except OSError:
+            pass
+        return tuple(parts)
+
+    def open(self):
+        static = not any(os.path.exists(f"{self.path}{suffix}") for suffix in ('-wal', '-journal'))
+        uri = f"file:{quote(self.path)}?mode=ro" + ("&immutable=1" if static else "")
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=self.statements)
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_kib)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        version = self.fingerprint()
+        with self.lock:
+            if version != self.version:
+                for conn in self.idle:
+                    conn.close()
+                self.idle, self.version = [], version
+            conn = self.idle.pop() if self.idle else None
+        if conn is None:
+            conn = self.open()
+        try:
+            yield conn
+        finally:
+            with self.lock:
+                if version == self.version and len(self.idle) < self.size:
+                    self.idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+sqlite_pools = {}
+sqlite_pools_lock = threading.Lock()
 
-    # Calculate the total sales for the "Gold" ticket type
-    cursor.execute(query)
-    total_sales = cursor.fetchone()[0]
+def sqlite_pool(path):
+    path = os.path.realpath(path)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(path)
+    with sqlite_pools_lock:
+        if path not in sqlite_pools:
+            sqlite_pools[path] = SQLitePool(path)
+        return sqlite_pools[path]
+
+def sqlite_connection(path):
+    # Context manager yielding a pooled read-only connection to path.
+    return sqlite_pool(path).connection()
+
+# Materialized aggregates: SUM/COUNT/AVG of one expression grouped by the
+# column a query filters on, computed in one GROUP BY scan and kept per
+# database. Unchanged databases (same pool fingerprint) are answered from
+# memory; any change to the file (appends, UPDATEs, deletes, VACUUM) rescans,
+# so the totals always come from SQLite's own SUM. Tables declaring a
+# non-BINARY collation are left to SQLite, since its collated groups cannot be
+# matched with a dict lookup.
+aggregate_query_regex = re.compile(
+    r"^\s*SELECT\s+(SUM|COUNT|AVG)\s*\(\s*(.+?)\s*\)\s+FROM\s+(\w+)"
+    r"(?:\s+WHERE\s+(\w+)\s*=\s*'((?:[^']|'')*)')?\s*;?\s*$", re.I | re.S)
+
+materialized = {}
+materialized_locks = {}  # one lock per cache key, so scans of different queries run in parallel
+materialized_lock = threading.Lock()  # guards materialized_locks
+
+def scan_aggregates(conn, table, expr, column):
+    # {group value: [sum, count, rows]} of expr over table, grouped by column (one group if None).
+    group = column or "NULL"
+    return {value: [total, count, rows] for value, total, count, rows in conn.execute(
+        f"SELECT {group}, SUM({expr}), COUNT({expr}), COUNT(*) FROM {table} GROUP BY {group}")}
+
+def binary_collation(conn, table):
+    # False if the table's DDL declares any collation other than BINARY.
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ? COLLATE NOCASE", (table,)).fetchone()
+    return not (row and row[0] and any(name.upper() != 'BINARY' for name in re.findall(r"\bCOLLATE\s+\"?(\w+)", row[0], re.I)))
+
+def materialized_aggregates(path, table, expr, column=None):
+    # {group value: [sum, count, rows]}, or None when the table uses a non-BINARY collation.
+    pool = sqlite_pool(path)
+    key = (pool.path, table, expr, column)
+    with materialized_lock:
+        lock = materialized_locks.setdefault(key, threading.Lock())
+    with lock:
+        fingerprint = pool.fingerprint()
+        cached = materialized.get(key)
+        if cached and cached['fingerprint'] == fingerprint:
+            return cached['groups']
+        with pool.connection() as conn:
+            groups = scan_aggregates(conn, table, expr, column) if binary_collation(conn, table) else None
+        materialized[key] = {'fingerprint': fingerprint, 'groups': groups}
+        return groups
+
+def cached_aggregate(path, query):
+    # fetchall()-style rows for a "SELECT SUM|COUNT|AVG(expr) FROM table
+    # [WHERE column = 'value']" query, or None if the query has another shape.
+    match = aggregate_query_regex.match(query)
+    if not match:
+        return None
+    function, expr, table, column, value = match.groups()
+    function = function.upper()
+    if expr == '*' and function != 'COUNT':
+        return None
+    try:
+        groups = materialized_aggregates(path, table, '1' if expr == '*' else expr, column)
+    except sqlite3.OperationalError:
+        return None  # e.g. a missing table
+    if groups is None:
+        return None
+    if column is None:
+        total, count, rows = groups.get(None, [None, 0, 0])
+    else:
+        value = value.replace("''", "'")
+        if value not in groups and not all(isinstance(group, str) for group in groups):
+            return None  # numeric column: leave type affinity to SQLite
+        total, count, rows = groups.get(value, [None, 0, 0])
+    if function == 'COUNT':
+        return [(rows if expr == '*' else count,)]
+    if function == 'AVG':
+        return [(total / count if count else None,)]
+    return [(total,)]
+
+
+def A10(filename='/data/ticket-sales.db', output_filename='/data/ticket-sales-gold.txt', query="SELECT SUM(units * price) FROM tickets WHERE type = 'Gold'"):
+    # Calculate the total sales for the "Gold" ticket type, from the aggregate
+    # cache when the query allows it, else on a pooled read-only connection
+    rows = cached_aggregate(filename, query)
+    if rows is None:
+        with sqlite_connection(filename) as conn:
+            rows = [conn.execute(query).fetchone()]
+    total_sales = rows[0][0]
 
     # If there are no sales, set total_sales to 0
     total_sales = total_sales if total_sales else 0
@@ -269,6 +2066,3 @@ def A10(filename='/data/ticket-sales.db', output_filename='/data/ticket-sales-go
     # Write the total sales to the file
     with open(output_filename, 'w') as file:
         file.write(str(total_sales))
-
-    # Close the database connection
-    conn.close()
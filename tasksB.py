@@ -2,6 +2,7 @@
 
 # B1 & B2: Security Checks
 import os
+import subprocess
 import httpx
 
 def B12(filepath):
@@ -12,18 +13,322 @@ def B12(filepath):
     else:
         return False
 
+# B3 & B6 downloads: bodies are streamed in chunks to <path>.part through one
+# pooled client and renamed into place once complete, so memory stays flat,
+# bytes are saved as sent and a failed download never leaves a truncated file.
+# A .part left behind is resumed with a Range request (If-Range guards against
+# the resource having changed in between).
+http_clients = {}
+
+def http_client():
+    # One keep-alive connection pool per process, shared by all downloads.
+    client = http_clients.get(os.getpid())
+    if client is None:
+        client = http_clients[os.getpid()] = httpx.Client(
+            follow_redirects=True, timeout=httpx.Timeout(30, read=60),
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16))
+    return client
+
+def download(url, path, chunk_size=1 << 16, retries=3, progress=None, headers=None):
+    # Stream url into path. progress(done, total) is called per chunk; total is
+    # None without a Content-Length. Returns {"bytes", "resumed", "status",
+    # "headers"}, resumed being the bytes kept from an earlier attempt. With
+    # conditional headers a 304 leaves path alone and returns bytes 0.
+    import logging, time
+    log = logging.getLogger(__name__)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    part, validator_path = path + ".part", path + ".part.validator"
+    resumed, status, response_headers = 0, None, {}
+    for attempt in range(retries + 1):
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        validator = None
+        if offset and os.path.exists(validator_path):
+            with open(validator_path, encoding="utf-8") as f:
+                validator = f.read() or None
+        # identity encoding, so byte ranges and Content-Length match the file
+        request_headers = {**(headers or {}), "Accept-Encoding": "identity"}
+        if offset:
+            request_headers["Range"] = f"bytes={offset}-"
+            if validator:
+                request_headers["If-Range"] = validator
+        try:
+            with http_client().stream("GET", url, headers=request_headers) as response:
+                status, response_headers = response.status_code, dict(response.headers)
+                if response.status_code == 304:
+                    return {"bytes": 0, "resumed": 0, "status": status, "headers": response_headers}
+                if response.status_code == 416 and offset:
+                    # Nothing left to send: the .part is complete if its size
+                    # matches the one in Content-Range, else start over.
+                    if response.headers.get("content-range", "").endswith(f"/{offset}"):
+                        resumed = offset
+                        break
+                    os.remove(part)
+                    continue
+                response.raise_for_status()
+                if response.status_code != 206:
+                    offset = 0  # Range ignored or resource changed
+                length = response.headers.get("content-length")
+                total = offset + int(length) if length and length.isdigit() else None
+                with open(validator_path, "w", encoding="utf-8") as f:
+                    f.write(response.headers.get("etag") or response.headers.get("last-modified") or "")
+                resumed = offset
+                done, logged = offset, 0
+                with open(part, "ab" if offset else "wb") as f:
+                    for chunk in response.iter_bytes(chunk_size):
+                        f.write(chunk)
+                        done += len(chunk)
+                        if progress:
+                            progress(done, total)
+                        elif total and done * 10 // total > logged:
+                            logged = done * 10 // total
+                            log.info("%s: %d/%d bytes (%d%%)", url, done, total, done * 100 // total)
+                if total is not None and done < total:
+                    raise httpx.ReadError(f"Connection closed after {done} of {total} bytes")
+            break
+        except httpx.TransportError as e:
+            if attempt == retries:
+                raise Exception(f"Error downloading {url}: {e}")
+            log.warning("%s: %s; resuming (attempt %d of %d)", url, e, attempt + 1, retries)
+            time.sleep(min(10, 2 ** attempt))
+    os.replace(part, path)
+    if os.path.exists(validator_path):
+        os.remove(validator_path)
+    return {"bytes": os.path.getsize(path), "resumed": resumed, "status": status, "headers": response_headers}
+
+# HTTP cache for B3 & B6: one body file and one JSON header file per URL under
+# HTTP_CACHE (default /data/.http-cache). Entries still fresh by Cache-Control
+# max-age, Expires or (heuristically) a tenth of their Last-Modified age are
+# served without a request; stale ones are revalidated with If-None-Match /
+# If-Modified-Since, a 304 reusing the stored body. no-store responses are not
+# kept and no-cache ones are always revalidated. Bodies are bounded to
+# HTTP_CACHE_BYTES in total, evicting the least recently used.
+class HttpCache:
+    def __init__(self, root=None, max_bytes=None):
+        import threading
+        self.root = root or os.getenv("HTTP_CACHE", "/data/.http-cache")
+        self.max_bytes = max_bytes or int(os.getenv("HTTP_CACHE_BYTES", 1 << 30))
+        self.lock = threading.Lock()
+        self.metrics = {"hits": 0, "revalidated": 0, "misses": 0, "stored": 0, "evicted": 0,
+                        "bytes_served": 0, "bytes_fetched": 0}
+
+    def paths(self, url):
+        import hashlib
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, key + ".body"), os.path.join(self.root, key + ".json")
+
+    def count(self, **amounts):
+        with self.lock:
+            for name, amount in amounts.items():
+                self.metrics[name] += amount
+
+    def lookup(self, url):
+        import json
+        body_path, meta_path = self.paths(url)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("url") == url and os.path.exists(body_path) else None
+
+    def cache_control(self, headers):
+        directives = {}
+        for part in headers.get("cache-control", "").lower().split(","):
+            name, _, value = part.strip().partition("=")
+            if name:
+                directives[name] = value.strip('"')
+        return directives
+
+    def is_fresh(self, meta, now):
+        # RFC 9111 freshness: lifetime from max-age, Expires or Last-Modified,
+        # against the age the response had when stored plus time since.
+        import time
+        from email.utils import parsedate_to_datetime
+        headers = meta["headers"]
+        directives = self.cache_control(headers)
+        if "no-cache" in directives:
+            return False
+
+        def timestamp(name):
+            try:
+                return parsedate_to_datetime(headers[name]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                return None
+        date = timestamp("date") or meta["stored_at"]
+        if directives.get("max-age", "").isdigit():
+            lifetime = int(directives["max-age"])
+        elif "expires" in headers:
+            expires = timestamp("expires")
+            lifetime = expires - date if expires is not None else 0  # invalid Expires: already expired
+        elif timestamp("last-modified") is not None:
+            lifetime = min(86400, (date - timestamp("last-modified")) / 10)
+        else:
+            lifetime = 0
+        age = int(headers["age"]) if headers.get("age", "").isdigit() else 0
+        return lifetime > age + (now - meta["stored_at"])
+
+    def store(self, url, path, headers, now):
+        import shutil
+        body_path, meta_path = self.paths(url)
+        os.makedirs(self.root, exist_ok=True)
+        shutil.copyfile(path, body_path + ".tmp")
+        os.replace(body_path + ".tmp", body_path)
+        self.write_meta(meta_path, {"url": url, "stored_at": now, "headers": headers})
+        self.count(stored=1)
+        self.evict()
+
+    def write_meta(self, meta_path, meta):
+        import json
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def serve(self, url, path):
+        # Copy the stored body into place and mark the entry as recently used.
+        import shutil
+        body_path, _ = self.paths(url)
+        shutil.copyfile(body_path, path + ".part")
+        os.replace(path + ".part", path)
+        os.utime(body_path)
+        return os.path.getsize(path)
+
+    def evict(self):
+        entries = []
+        with os.scandir(self.root) as scan:
+            for entry in scan:
+                if entry.name.endswith(".body"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, body_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for stale in (body_path, body_path[:-len(".body")] + ".json"):
+                if os.path.exists(stale):
+                    os.remove(stale)
+            total -= size
+            self.count(evicted=1)
+
+    def fetch(self, url, path):
+        # download() through the cache; the result gains "cache": hit,
+        # revalidated, miss or bypass (not storable).
+        import logging, time
+        now = time.time()
+        meta = self.lookup(url)
+        if meta is not None and self.is_fresh(meta, now):
+            size = self.serve(url, path)
+            self.count(hits=1, bytes_served=size)
+            return {"bytes": size, "resumed": 0, "status": 200, "headers": meta["headers"], "cache": "hit"}
+        conditional = {}
+        if meta is not None:
+            if meta["headers"].get("etag"):
+                conditional["If-None-Match"] = meta["headers"]["etag"]
+            if meta["headers"].get("last-modified"):
+                conditional["If-Modified-Since"] = meta["headers"]["last-modified"]
+        result = download(url, path, headers=conditional)
+        if result["status"] == 304 and meta is not None:
+            # Keep the stored body, refreshing the headers the 304 carried.
+            meta["headers"].update({name: value for name, value in result["headers"].items()
+                                    if name in ("cache-control", "date", "etag", "expires", "last-modified", "age")})
+            meta["stored_at"] = now
+            self.write_meta(self.paths(url)[1], meta)
+            size = self.serve(url, path)
+            self.count(revalidated=1, bytes_served=size)
+            result.update(bytes=size, status=200, headers=meta["headers"], cache="revalidated")
+        else:
+            self.count(misses=1, bytes_fetched=result["bytes"])
+            directives = self.cache_control(result["headers"])
+            result["cache"] = "bypass"
+            if result["status"] == 200 and "no-store" not in directives and result["bytes"] <= self.max_bytes:
+                try:
+                    self.store(url, path, result["headers"], now)
+                    result["cache"] = "miss"
+                except OSError as e:
+                    logging.getLogger(__name__).warning("HTTP cache: cannot store %s: %s", url, e)
+        logging.getLogger(__name__).info("HTTP cache %s for %s; totals %s", result["cache"], url, self.metrics)
+        return result
+
+http_caches = {}
+
+def http_cache(root=None):
+    root = root or os.getenv("HTTP_CACHE", "/data/.http-cache")
+    if root not in http_caches:
+        http_caches[root] = HttpCache(root)
+    return http_caches[root]
+
+def fetch_url(url, path, use_cache=True):
+    return http_cache().fetch(url, path) if use_cache else download(url, path)
+
 # B3: Fetch Data from an API
-def B3(url, save_path):
+def B3(url, save_path, use_cache=True):
     if not B12(save_path):
         raise PermissionError("Output file must be under /data.")
-    import httpx
-    response = httpx.get(url)
-    with open(save_path, "w", encoding="utf-8") as f:
-        f.write(response.text)
+    return fetch_url(url, save_path, use_cache)
+
 
 
+# B4 mirror cache: each repository URL gets a bare mirror under GIT_MIRRORS
+# (default /data/.git-mirrors), created once with `git clone --mirror` and
+# brought up to date with an incremental fetch when older than refresh
+# seconds. Working copies come from the mirror: a local clone hardlinks its
+# objects, reference=True borrows them through alternates (git clone
+# --shared), depth makes a shallow clone and sparse a partial clone checking
+# out only the given directories. origin is pointed back at the real URL.
+def git_mirror(repo_url, refresh=60, root=None):
+    import fcntl, hashlib, logging, re, shutil, time
+    root = root or os.getenv("GIT_MIRRORS", "/data/.git-mirrors")
+    os.makedirs(root, exist_ok=True)
+    name = re.sub(r"[^\w.-]", "_", os.path.basename(repo_url.rstrip("/")))[:40]
+    mirror = os.path.join(root, f"{name}-{hashlib.sha1(repo_url.encode('utf-8')).hexdigest()[:12]}")
+    fetched = mirror + ".fetched"
+    with open(mirror + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not os.path.isdir(mirror):
+            # A clone interrupted earlier leaves mirror.tmp behind; start afresh.
+            shutil.rmtree(mirror + ".tmp", ignore_errors=True)
+            try:
+                subprocess.run(["git", "clone", "--mirror", "--quiet", repo_url, mirror + ".tmp"], check=True)
+                # Shared clones rely on the mirror's objects, so gc must never
+                # prune them; allow filters for sparse partial clones.
+                for key, value in (("gc.pruneExpire", "never"), ("gc.reflogExpireUnreachable", "never"),
+                                   ("uploadpack.allowFilter", "true")):
+                    subprocess.run(["git", "-C", mirror + ".tmp", "config", key, value], check=True)
+            except BaseException:
+                shutil.rmtree(mirror + ".tmp", ignore_errors=True)
+                raise
+            os.replace(mirror + ".tmp", mirror)
+        elif not os.path.exists(fetched) or time.time() - os.path.getmtime(fetched) >= refresh:
+            try:
+                subprocess.run(["git", "-C", mirror, "fetch", "--prune", "--quiet", "origin"], check=True)
+            except subprocess.CalledProcessError as e:
+                # e.g. the remote is unreachable: clone what the mirror already has.
+                logging.getLogger(__name__).warning("Could not refresh git mirror of %s, using it as is: %s", repo_url, e)
+                return mirror
+        else:
+            return mirror
+        open(fetched, "w").close()
+    return mirror
 
-def B4(repo_url, target_dir, filename, commit_message, filecontent):
+def clone_from_mirror(repo_url, target_dir, branch=None, depth=None, sparse=None, reference=False, refresh=60):
+    mirror = git_mirror(repo_url, refresh)
+    command = ["git", "clone", "--quiet"]
+    if branch:
+        command += ["--branch", branch]
+    if depth or sparse:
+        # --depth and --filter only apply to transports, so go through file://.
+        source = "file://" + mirror
+        command += ["--depth", str(depth)] if depth else []
+        command += ["--filter=blob:none", "--sparse"] if sparse else []
+    else:
+        source = mirror
+        command += ["--shared"] if reference else []
+    subprocess.run(command + [source, target_dir], check=True)
+    if sparse:
+        subprocess.run(["git", "-C", target_dir, "sparse-checkout", "set", *sparse], check=True)
+    subprocess.run(["git", "-C", target_dir, "remote", "set-url", "origin", repo_url], check=True)
+
+def B4(repo_url, target_dir, filename, commit_message, filecontent, use_mirror=True, branch=None, depth=None,
+       sparse=None, reference=False, refresh=60):
     # Ensure /data exists
     os.makedirs("/data", exist_ok=True)
     # Remove "file://" prefix if present
@@ -33,7 +338,10 @@ def B4(repo_url, target_dir, filename, commit_message, filecontent):
     if not os.path.abspath(target_dir).startswith(os.path.abspath("/data")):
         raise PermissionError("Target directory must be under /data.")
     # Clone the repository into the target directory
-    subprocess.run(["git", "clone", repo_url, target_dir], check=True)
+    if use_mirror:
+        clone_from_mirror(repo_url, target_dir, branch, depth, sparse, reference, refresh)
+    else:
+        subprocess.run(["git", "clone", *(["--branch", branch] if branch else []), repo_url, target_dir], check=True)
     # Verify clone was successful by checking for the .git directory
     git_dir = os.path.join(target_dir, ".git")
     if not os.path.exists(git_dir):
@@ -46,51 +354,568 @@ def B4(repo_url, target_dir, filename, commit_message, filecontent):
     subprocess.run(["git", "-C", target_dir, "add", filename], check=True)
     subprocess.run(["git", "-C", target_dir, "commit", "-m", commit_message], check=True)
 
-def B5(db_path, query, output_filename):
+def widen_arrow_type(current, values):
+    # The Arrow type holding both current and values: NULL-only columns take
+    # the other type, ints and floats become float64, anything else mixed is text.
+    import pyarrow as pa
+    try:
+        found = pa.array(values).type
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        return pa.string()
+    if pa.types.is_null(found) or found == current:
+        return current
+    if pa.types.is_null(current):
+        return found
+    numeric = lambda t: pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_decimal(t)
+    if numeric(current) and numeric(found):
+        return pa.float64()
+    return pa.string()
+
+def arrow_column(values, arrow_type):
+    import pyarrow as pa
+    if pa.types.is_string(arrow_type):
+        values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+    elif pa.types.is_floating(arrow_type):
+        values = [value if value is None else float(value) for value in values]
+    return pa.array(values, arrow_type)
+
+def write_query_result(columns, batches, output_filename, max_rows=None):
+    # Stream row batches to output_filename in the format its extension names:
+    # .csv (with header), .jsonl/.ndjson (one object per row), .parquet, or
+    # plain text (tab-separated rows, one per line; a single value is written
+    # bare). Returns {"rows", "bytes", "truncated"}.
+    import csv, json
+    ext = os.path.splitext(output_filename)[1].lower()
+    rows = 0
+    truncated = False
+
+    def capped():
+        nonlocal rows, truncated
+        for batch in batches:
+            if max_rows is not None and rows + len(batch) > max_rows:
+                batch = batch[:max_rows - rows]
+                truncated = True
+            rows += len(batch)
+            if batch:
+                yield batch
+            if truncated:
+                return
+
+    if ext == '.parquet':
+        import pickle, tempfile
+        import pyarrow as pa, pyarrow.parquet as pq
+        # A Parquet schema is fixed once the file is opened, but a column can
+        # be all NULL in the first batches or mix SQLite types. So batches are
+        # spooled to a temp file while each column's type is widened, then
+        # written in a second pass.
+        types = [pa.null()] * len(columns)
+        with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(output_filename))) as spool:
+            spooled = 0
+            for batch in capped():
+                pickle.dump(batch, spool, pickle.HIGHEST_PROTOCOL)
+                spooled += 1
+                types = [widen_arrow_type(types[i], [row[i] for row in batch]) for i in range(len(columns))]
+            schema = pa.schema(list(zip(columns, types)))
+            spool.seek(0)
+            with pq.ParquetWriter(output_filename, schema) as writer:
+                for _ in range(spooled):
+                    batch = pickle.load(spool)
+                    writer.write_table(pa.Table.from_arrays(
+                        [arrow_column([row[i] for row in batch], types[i]) for i in range(len(columns))], schema=schema))
+    else:
+        with open(output_filename, 'w', encoding="utf-8", newline='') as file:
+            if ext == '.csv':
+                writer = csv.writer(file)
+                writer.writerow(columns)
+                for batch in capped():
+                    writer.writerows(batch)
+            elif ext in ('.jsonl', '.ndjson'):
+                for batch in capped():
+                    file.writelines(json.dumps(dict(zip(columns, row)), default=str) + '\n' for row in batch)
+            else:
+                first = True
+                for batch in capped():
+                    for row in batch:
+                        file.write(('' if first else '\n') + '\t'.join(str(value) for value in row))
+                        first = False
+    return {"rows": rows, "bytes": os.path.getsize(output_filename), "truncated": truncated}
+
+# B5 engine routing: analytical SELECTs (GROUP BY, window functions, joins,
+# DISTINCT, set operations) over SQLite files can run on DuckDB through its
+# sqlite scanner, attached read-only, with integer division switched on to
+# match SQLite's "/" and NULLs sorting first on ASC as in SQLite. Only
+# queries with a top-level ORDER BY are routed, since SQLite returns GROUP BY
+# and DISTINCT results in its own (sorted) order and DuckDB in hash order.
+# Queries using LIKE or GLOB stay on SQLite because DuckDB's LIKE is
+# case-sensitive. If DuckDB cannot load the scanner or rejects the query,
+# SQLite runs it instead.
+duckdb_sqlite_unavailable = False
+
+def analytical_query(query):
+    import re
+    # ORDER BY inside subqueries or OVER (...) does not fix the output order.
+    outer, previous = re.sub(r"'(?:[^']|'')*'", "''", query), None
+    while outer != previous:
+        outer, previous = re.sub(r"\([^()]*\)", "", outer), outer
+    return (re.match(r"\s*(SELECT|WITH)\b", query, re.I) is not None
+            and re.search(r"\b(GROUP\s+BY|OVER\s*\(|JOIN|DISTINCT|UNION|INTERSECT|EXCEPT)", query, re.I) is not None
+            and re.search(r"\bORDER\s+BY\b", outer, re.I) is not None
+            and re.search(r"\b(LIKE|GLOB)\b", query, re.I) is None)
+
+def duckdb_connection(threads=None, memory_limit=None):
+    import duckdb
+    return duckdb.connect(config={
+        "threads": threads or os.cpu_count() or 1,
+        "memory_limit": memory_limit or os.getenv("DUCKDB_MEMORY_LIMIT", "2GB"),
+    })
+
+def duckdb_sqlite_connection(db_path, threads=None, memory_limit=None):
+    # DuckDB connection with db_path attached read-only and selected as the default schema.
+    import duckdb
+    conn = duckdb_connection(threads, memory_limit)
+    try:
+        conn.execute("SET integer_division = true")
+        conn.execute("SET default_null_order = 'nulls_first_on_asc_last_on_desc'")
+        conn.execute(f"ATTACH '{db_path.replace(chr(39), chr(39) * 2)}' AS db (TYPE sqlite, READ_ONLY)")
+        conn.execute("USE db")
+    except duckdb.Error:
+        conn.close()
+        raise
+    return conn
+
+def read_only_query(query):
+    # Plain SELECT (or WITH ... SELECT) statements can use the read-only pool;
+    # anything else, or anything unsure, gets a normal writable connection.
+    import re
+    if re.match(r"\s*SELECT\b", query, re.I):
+        return ";" not in query.strip().rstrip(";")
+    return bool(re.match(r"\s*WITH\b", query, re.I)) and not re.search(
+        r"\b(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b", query, re.I)
+
+def B5(db_path, query, output_filename, max_rows=None, batch_size=10000, engine="auto", threads=None, memory_limit=None):
     # Ensure both the database and output file are under /data.
     if not (B12(db_path) and B12(output_filename)):
         raise PermissionError("Both database and output file must be under /data.")
-    import sqlite3, duckdb
-    # Use sqlite3 if the database ends with '.db', else duckdb.
-    conn = sqlite3.connect(db_path) if db_path.endswith('.db') else duckdb.connect(db_path)
-    cur = conn.cursor()
-    cur.execute(query)
-    result = cur.fetchall()
-    conn.close()
-    # Extract the numeric value from the result (assumes result is a list of tuples).
-    if result and result[0]:
-        value = result[0][0]
-    else:
-        value = ""
-    with open(output_filename, 'w', encoding="utf-8") as file:
-        file.write(str(value))
-    return value
+    global duckdb_sqlite_unavailable
+    import logging, re, sqlite3
+    from contextlib import ExitStack, closing
+    import duckdb
+    from tasksA import cached_aggregate, sqlite_connection
+    log = logging.getLogger(__name__)
+    read_only = read_only_query(query)
+    with ExitStack() as stack:
+        # Simple SUM/COUNT/AVG queries are answered from the materialized aggregates.
+        result = cached_aggregate(db_path, query) if db_path.endswith('.db') and read_only and engine != "duckdb" else None
+        cur = writable = None
+        if result is not None:
+            columns = [re.match(r"\s*SELECT\s+(.*?)\s+FROM\s", query, re.I | re.S).group(1)]
+            batches = [result]
+        else:
+            # engine: "sqlite", "duckdb", or "auto" to send analytical queries to DuckDB.
+            if db_path.endswith('.db') and read_only and not duckdb_sqlite_unavailable and (
+                    engine == "duckdb" or (engine == "auto" and analytical_query(query))):
+                try:
+                    conn = stack.enter_context(duckdb_sqlite_connection(db_path, threads, memory_limit))
+                except duckdb.Error as e:
+                    duckdb_sqlite_unavailable = True
+                    log.warning("DuckDB sqlite scanner unavailable, using SQLite: %s", e)
+                else:
+                    try:
+                        cur = conn.execute(query)
+                    except duckdb.Error as e:
+                        log.warning("DuckDB could not run the query, using SQLite: %s", e)
+            if cur is None:
+                # Use sqlite3 if the database ends with '.db' (the pooled read-only
+                # connection for SELECTs, a normal one for writes), else duckdb.
+                if db_path.endswith('.db') and read_only:
+                    cur = stack.enter_context(sqlite_connection(db_path)).cursor()
+                elif db_path.endswith('.db'):
+                    writable = stack.enter_context(closing(sqlite3.connect(db_path)))
+                    cur = writable.cursor()
+                else:
+                    cur = stack.enter_context(duckdb.connect(db_path)).cursor()
+                cur.execute(query)
+            columns = [column[0] for column in cur.description or []]
+            batches = iter(lambda: cur.fetchmany(batch_size), [])
+        stats = write_query_result(columns, batches, output_filename, max_rows)
+        if writable is not None:
+            writable.commit()
+    log.info("B5 wrote %(rows)d rows, %(bytes)d bytes (truncated: %(truncated)s)", stats)
+    return stats
 
 
 
 # B6: Web Scraping
-def B6(url, output_filename):
-    import requests
-    result = requests.get(url).text
-    with open(output_filename, 'w') as file:
-        file.write(str(result))
+# With urls, fields or follow given, B6 crawls instead: pages are fetched
+# concurrently (at most per_host at a time and delay seconds apart per host,
+# honouring robots.txt), parsed as they stream in, and one JSON line per page
+# with the requested fields is written to output_filename.
+#
+# Fields map a name to a CSS selector: tag, #id, .class, [attr], [attr=value],
+# descendant (space) and child (>) combinators, ending in ::text (the default)
+# or ::attr(name). A selector string yields the first match or null; a
+# one-element list like ["a::attr(href)"] yields every match.
+def parse_selector(selector):
+    import re
+    extract = ("text", None)
+    selector = selector.strip()
+    attr = re.search(r"::attr\(([^)]+)\)$", selector)
+    if attr:
+        extract, selector = ("attr", attr.group(1).strip().lower()), selector[:attr.start()]
+    elif selector.endswith("::text"):
+        selector = selector[:-len("::text")]
+    steps, combinator = [], " "
+    for token in re.findall(r">|[^\s>]+", selector):
+        if token == ">":
+            combinator = ">"
+            continue
+        simple = r"(#|\.)?([\w-]+)|\[([\w-]+)(=['\"]?[^'\"\]]*['\"]?)?\]|(\*)"
+        if not re.fullmatch(f"(?:{simple})+", token):
+            raise ValueError(f"Unsupported selector {token!r} in {selector!r}")
+        parts = re.findall(simple, token)
+        step = {"combinator": combinator, "tag": None, "id": None, "classes": set(), "attrs": []}
+        for prefix, name, attr_name, attr_value, star in parts:
+            if attr_name:
+                step["attrs"].append((attr_name.lower(), attr_value[1:].strip("'\"") if attr_value else None))
+            elif prefix == "#":
+                step["id"] = name
+            elif prefix == ".":
+                step["classes"].add(name)
+            elif name:
+                step["tag"] = name.lower()
+        steps.append(step)
+        combinator = " "
+    if not steps:
+        raise ValueError(f"Empty selector {selector!r}")
+    return steps, extract
+
+def step_matches(step, element):
+    tag, attrs, classes = element
+    return ((step["tag"] is None or step["tag"] == tag)
+            and (step["id"] is None or attrs.get("id") == step["id"])
+            and step["classes"] <= classes
+            and all(name in attrs and (value is None or attrs[name] == value) for name, value in step["attrs"]))
+
+def selector_matches(steps, stack):
+    # Does the innermost element of stack match, with its ancestors matching
+    # the earlier steps?
+    def match(step_index, depth):
+        step = steps[step_index]
+        if not step_matches(step, stack[depth]):
+            return False
+        if step_index == 0:
+            return True
+        if step["combinator"] == ">":
+            return depth > 0 and match(step_index - 1, depth - 1)
+        return any(match(step_index - 1, ancestor) for ancestor in range(depth - 1, -1, -1))
+    return match(len(steps) - 1, len(stack) - 1)
+
+from html.parser import HTMLParser
+
+class FieldExtractor(HTMLParser):
+    # Incremental: feed() the page as it arrives, then close() and read
+    # values ({field: [matches]}) and links (absolute a[href] URLs).
+    void_tags = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+    # Tags whose end tag may be left out before a sibling of the same kind.
+    implied_end_tags = {"li", "p", "dt", "dd", "tr", "td", "th", "option"}
+
+    def __init__(self, base_url, selectors):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.selectors = selectors
+        self.values = {name: [] for name in selectors}
+        self.links = []
+        self.stack = []
+        self.captures = []  # [name, depth, text parts]
+
+    def handle_starttag(self, tag, attrs):
+        from urllib.parse import urljoin
+        attrs = {name: value or "" for name, value in attrs}
+        if tag in self.implied_end_tags and self.stack and self.stack[-1][0] == tag:
+            self.handle_endtag(tag)
+        if tag == "base" and attrs.get("href"):
+            self.base_url = urljoin(self.base_url, attrs["href"])
+        if tag == "a" and attrs.get("href"):
+            self.links.append(urljoin(self.base_url, attrs["href"]).split("#")[0])
+        self.stack.append((tag, attrs, set(attrs.get("class", "").split())))
+        for name, (steps, (kind, attr)) in self.selectors.items():
+            if selector_matches(steps, self.stack):
+                if kind == "attr":
+                    if attr in attrs:
+                        value = attrs[attr]
+                        self.values[name].append(urljoin(self.base_url, value) if attr in ("href", "src") else value)
+                elif tag not in self.void_tags:
+                    self.captures.append([name, len(self.stack), []])
+        if tag in self.void_tags:
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        # Close up to the matching open tag; stray end tags are ignored.
+        for depth in range(len(self.stack) - 1, -1, -1):
+            if self.stack[depth][0] == tag:
+                del self.stack[depth:]
+                break
+        open_captures = []
+        for capture in self.captures:
+            if capture[1] > len(self.stack):
+                self.values[capture[0]].append(" ".join("".join(capture[2]).split()))
+            else:
+                open_captures.append(capture)
+        self.captures = open_captures
+
+    def handle_data(self, data):
+        if self.stack and self.stack[-1][0] in ("script", "style"):
+            return
+        for capture in self.captures:
+            capture[2].append(data)
+
+    def close(self):
+        super().close()
+        # Elements left open at the end of the page end with it.
+        for name, _, parts in self.captures:
+            self.values[name].append(" ".join("".join(parts).split()))
+        self.captures = []
+
+class Crawler:
+    def __init__(self, fields, follow=None, max_pages=100, max_depth=1, per_host=2, delay=0.5,
+                 concurrency=16, same_host=True, robots=True, timeout=30):
+        import re
+        self.fields = fields or {}
+        self.selectors = {name: parse_selector(selector[0] if isinstance(selector, list) else selector)
+                          for name, selector in self.fields.items()}
+        self.follow = [re.compile(pattern) for pattern in ([follow] if isinstance(follow, str) else follow or [])]
+        self.max_pages, self.max_depth = max_pages, max_depth
+        self.per_host, self.delay = per_host, delay
+        self.concurrency, self.same_host = concurrency, same_host
+        self.robots, self.timeout = robots, timeout
+        self.hosts = {}  # host -> {"semaphore", "lock", "next", "robots"}
+        self.seen = set()
+        self.stats = {"pages": 0, "errors": 0, "bytes": 0}
+
+    def host_state(self, host):
+        import asyncio
+        if host not in self.hosts:
+            self.hosts[host] = {"semaphore": asyncio.Semaphore(self.per_host), "lock": asyncio.Lock(),
+                                "next": 0.0, "robots": None}
+        return self.hosts[host]
+
+    async def polite(self, state):
+        # Space request starts to one host at least delay seconds apart.
+        import asyncio, time
+        async with state["lock"]:
+            wait = state["next"] - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            state["next"] = time.monotonic() + self.delay
+
+    async def allowed(self, client, url):
+        from urllib.parse import urlsplit
+        from urllib.robotparser import RobotFileParser
+        if not self.robots:
+            return True
+        parts = urlsplit(url)
+        state = self.host_state(parts.netloc)
+        async with state["lock"]:
+            if state["robots"] is None:
+                rules = RobotFileParser()
+                try:
+                    response = await client.get(f"{parts.scheme}://{parts.netloc}/robots.txt")
+                    rules.parse(response.text.splitlines() if response.status_code == 200 else [])
+                except httpx.HTTPError:
+                    rules.parse([])
+                state["robots"] = rules
+        return state["robots"].can_fetch(client.headers.get("user-agent", "*"), url)
+
+    async def fetch(self, client, url):
+        # Stream one page through FieldExtractor; returns (record, links).
+        import codecs
+        from urllib.parse import urlsplit
+        state = self.host_state(urlsplit(url).netloc)
+        async with state["semaphore"]:
+            await self.polite(state)
+            async with client.stream("GET", url) as response:
+                record = {"url": url, "status": response.status_code}
+                if str(response.url) != url:
+                    record["final_url"] = str(response.url)
+                content_type = response.headers.get("content-type", "")
+                if response.status_code >= 400 or (content_type and "html" not in content_type):
+                    await response.aclose()
+                    return record, []
+                extractor = FieldExtractor(str(response.url), self.selectors)
+                decoder = codecs.getincrementaldecoder(response.charset_encoding or "utf-8")(errors="replace")
+                async for chunk in response.aiter_bytes():
+                    self.stats["bytes"] += len(chunk)
+                    extractor.feed(decoder.decode(chunk))
+                extractor.feed(decoder.decode(b"", final=True))
+                extractor.close()
+        for name, selector in self.fields.items():
+            matches = extractor.values[name]
+            record[name] = matches if isinstance(selector, list) else (matches[0] if matches else None)
+        return record, extractor.links
+
+    def should_follow(self, link, seeds):
+        from urllib.parse import urlsplit
+        parts = urlsplit(link)
+        if parts.scheme not in ("http", "https") or link in self.seen:
+            return False
+        if self.same_host and parts.netloc not in seeds:
+            return False
+        return any(pattern.search(link) for pattern in self.follow)
+
+    async def run(self, urls, output_filename):
+        import asyncio, json
+        from urllib.parse import urlsplit
+        seeds = {urlsplit(url).netloc for url in urls}
+        queue = asyncio.Queue()
+        for url in dict.fromkeys(urls):
+            if len(self.seen) < self.max_pages:
+                self.seen.add(url)
+                queue.put_nowait((url, 0))
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(follow_redirects=True, limits=limits, timeout=self.timeout,
+                                     headers={"User-Agent": "dataworks-agent/1.0"}) as client:
+            with open(output_filename, "w", encoding="utf-8") as out:
+                async def worker():
+                    while True:
+                        url, depth = await queue.get()
+                        try:
+                            if not await self.allowed(client, url):
+                                record, links = {"url": url, "error": "disallowed by robots.txt"}, []
+                            else:
+                                record, links = await self.fetch(client, url)
+                            self.stats["pages"] += 1
+                        except Exception as e:  # recorded, so one bad page cannot stall the queue
+                            record, links = {"url": url, "error": str(e) or type(e).__name__}, []
+                            self.stats["errors"] += 1
+                        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        if depth < self.max_depth:
+                            for link in links:
+                                if len(self.seen) >= self.max_pages:
+                                    break
+                                if self.should_follow(link, seeds):
+                                    self.seen.add(link)
+                                    queue.put_nowait((link, depth + 1))
+                        queue.task_done()
+
+                workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+                await queue.join()
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+        return self.stats
+
+def B6(url=None, output_filename=None, use_cache=True, urls=None, fields=None, follow=None, max_pages=100,
+       max_depth=1, per_host=2, delay=0.5, concurrency=16, same_host=True, robots=True):
+    if output_filename is None:
+        raise ValueError("output_filename is required")
+    if urls is None and fields is None and follow is None:
+        return fetch_url(url, output_filename, use_cache)
+    from tasksA import run_async
+    urls = ([url] if url else []) + list(urls or [])
+    if not urls:
+        raise ValueError("Give url or urls to crawl")
+    os.makedirs(os.path.dirname(os.path.abspath(output_filename)), exist_ok=True)
+    crawler = Crawler(fields, follow, max_pages, max_depth if follow else 0, per_host, delay, concurrency,
+                      same_host, robots)
+    return run_async(crawler.run(urls, output_filename))
 
 # B7: Image Processing
-def B7(image_path, output_path, resize=None):
+# operations is an ordered list applied to one decoded image before a single
+# encode, e.g. [{"op": "crop", "box": [0, 0, 800, 600]}, {"op": "rotate",
+# "angle": 90}, {"op": "thumbnail", "size": [256, 256]}, {"op": "grayscale"},
+# {"op": "compress", "quality": 80}]; flip and orient (apply EXIF rotation)
+# are also available. resize keeps working as before and runs first. When the leading operations shrink a JPEG at least 4x, it is decoded
+# at 1/2-1/8 scale (draft mode) and resizes go through reducing_gap, which
+# first box-reduces by an integer factor; fast=False disables both.
+image_resamplers = {"nearest": 0, "lanczos": 1, "bilinear": 2, "bicubic": 3, "box": 4, "hamming": 5}
+# Encoder options per format; compress operations and save_options override.
+image_save_defaults = {
+    "JPEG": {"optimize": True, "progressive": True},
+}
+
+def target_size(size, op, box):
+    # Output size of a resize/thumbnail from size (thumbnail keeps aspect and never enlarges).
+    if op == "resize":
+        return tuple(box)
+    scale = min(box[0] / size[0], box[1] / size[1], 1)
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+def draft_image(img, operations, reducing_gap=2.0):
+    # Let a JPEG decode straight to a smaller size (and to grayscale) when the
+    # operations before any crop, rotate or flip only shrink or desaturate it.
+    mode, size = None, None
+    for operation in operations:
+        if operation["op"] == "grayscale":
+            mode = "L"
+        elif operation["op"] in ("resize", "thumbnail") and size is None:
+            size = target_size(img.size, operation["op"], operation["size"])
+        elif operation["op"] != "compress":
+            break
+    if size is not None and min(img.width / size[0], img.height / size[1]) < 2 * reducing_gap:
+        size = None
+    if mode is not None and img.mode not in ("RGB", "YCbCr"):
+        mode = None
+    if mode is not None or size is not None:
+        img.draft(mode, (round(size[0] * reducing_gap), round(size[1] * reducing_gap)) if size else img.size)
+
+def apply_image_operation(img, operation, fast):
+    from PIL import Image, ImageOps
+    op = operation["op"]
+    resample = image_resamplers[operation.get("resample", "bicubic" if op == "resize" else "lanczos")]
+    if op in ("resize", "thumbnail"):
+        size = target_size(img.size, op, operation["size"])
+        if size == img.size:
+            return img
+        gap = operation.get("reducing_gap", 3.0 if fast else None)
+        return img.resize(size, resample, reducing_gap=gap)
+    if op == "crop":
+        return img.crop(tuple(operation["box"]))
+    if op == "rotate":
+        angle = operation["angle"] % 360
+        if angle in (90, 180, 270):  # lossless and exact
+            return img.transpose({90: Image.Transpose.ROTATE_90, 180: Image.Transpose.ROTATE_180,
+                                  270: Image.Transpose.ROTATE_270}[angle])
+        return img.rotate(angle, resample=Image.Resampling.BICUBIC, expand=operation.get("expand", True),
+                          fillcolor=operation.get("fill"))
+    if op == "flip":
+        return img.transpose(Image.Transpose.FLIP_TOP_BOTTOM if operation.get("direction") == "vertical"
+                             else Image.Transpose.FLIP_LEFT_RIGHT)
+    if op == "grayscale":
+        return img.convert("LA" if "A" in img.getbands() else "L")
+    if op == "orient":
+        return ImageOps.exif_transpose(img)
+    raise ValueError(f"Unknown image operation {op!r}")
+
+def B7(image_path, output_path, resize=None, operations=None, save_options=None, fast=True):
     from PIL import Image
     # Enforce that both image_path and output_path are under /data.
     if not (B12(image_path) and B12(output_path)):
         raise PermissionError("Both image and output paths must be under /data.")
+    operations = ([{"op": "resize", "size": resize}] if resize else []) + list(operations or [])
+    for operation in operations:
+        if operation.get("op") not in ("resize", "thumbnail", "crop", "rotate", "flip", "grayscale", "orient", "compress"):
+            raise ValueError(f"Unknown image operation {operation.get('op')!r}")
     try:
         with Image.open(image_path) as img:
-            if resize:
-                img = img.resize(resize)
-            img.save(output_path)
+            source_format = img.format
+            if fast:
+                draft_image(img, operations)
+            options = {}
+            for operation in operations:
+                if operation["op"] == "compress":
+                    options.update({key: value for key, value in operation.items() if key != "op"})
+                else:
+                    img = apply_image_operation(img, operation, fast)
+            image_format = Image.registered_extensions().get(os.path.splitext(output_path)[1].lower(), source_format)
+            options = {**image_save_defaults.get(image_format, {}), **options, **(save_options or {})}
+            if image_format == "JPEG" and img.mode not in ("RGB", "L", "CMYK"):
+                img = img.convert("L" if img.mode in ("LA", "I", "I;16") else "RGB")
+            if image_format == "JPEG" and source_format == "JPEG" and "icc_profile" in img.info:
+                options.setdefault("icc_profile", img.info["icc_profile"])
+            img.save(output_path, image_format, **options)
     except Exception as e:
         raise Exception(f"Error processing image: {e}")
 
-
-
 def B8(audio_path, output_path):
     from pathlib import Path
     # Enforce that both audio_path and output_path are under /data.
@@ -133,39 +958,413 @@ def B9(md_path, output_path):
         file.write(html)
 
 # B10: API Endpoint for CSV Filtering
-def B10(csv_path, filter_column, filter_value, output_path):
+# The CSV is streamed in blocks with every column read as text, so matching
+# rows are written back exactly as they appear in the file (empty cells as
+# null). pyarrow's multithreaded parser is used when installed, else pandas in
+# chunks. Comparison is type-aware: "30", "30.0" and " 30" all equal 30.
+# Predicates are (column, op, value) with op one of eq, in, lt, le, gt, ge,
+# between and prefix; only the columns they and the output need are parsed.
+def csv_header(csv_path):
+    import csv
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        return next(csv.reader(f), [])
+
+def numeric_value(text):
+    # int for integer text, so large IDs compare exactly; float for other numbers.
+    if isinstance(text, (int, float)) and not isinstance(text, bool):
+        return text
+    for parse in (int, float):
+        try:
+            return parse(text)
+        except (TypeError, ValueError):
+            pass
+    return None
+
+def cell_equals(cell, value):
+    if cell is None:
+        return False
+    if cell == value:
+        return True
+    number = numeric_value(value)
+    return number is not None and numeric_value(cell) == number
+
+range_ops = {'lt': 'less', 'le': 'less_equal', 'gt': 'greater', 'ge': 'greater_equal'}
+predicate_ops = {'eq', 'in', 'between', 'prefix', *range_ops}
+
+def cell_matches(cell, op, value):
+    # Type-aware test of one cell (text or None) against a predicate.
+    import operator
+    if cell is None:
+        return False
+    if op == 'eq':
+        return cell_equals(cell, str(value))
+    if op == 'in':
+        return any(cell_equals(cell, str(item)) for item in value)
+    if op == 'prefix':
+        return cell.startswith(str(value))
+    if op == 'between':
+        return cell_matches(cell, 'ge', value[0]) and cell_matches(cell, 'le', value[1])
+    compare = getattr(operator, op)
+    number = numeric_value(value)
+    if number is None:
+        return compare(cell, str(value))
+    cell_number = numeric_value(cell)
+    return cell_number is not None and compare(cell_number, number)
+
+def predicate_mask(column, op, value):
+    # Boolean pyarrow mask of the cells of a string column matching a predicate.
+    import pyarrow as pa, pyarrow.compute as pc
+    operands = list(value) if op in ('in', 'between') else [value]
+    numeric = [numeric_value(item) for item in operands]
+    try:
+        if op == 'prefix':
+            mask = pc.starts_with(column, str(value))
+        elif all(number is not None for number in numeric):
+            trimmed, numbers = pc.utf8_trim_whitespace(column), None
+            if all(isinstance(number, int) and abs(number) < 2 ** 63 for number in numeric):
+                try:
+                    numbers, number_type = pc.cast(trimmed, pa.int64()), pa.int64()
+                except pa.ArrowInvalid:
+                    pass  # some cells are not integers
+            if numbers is None:
+                numbers, number_type = pc.cast(trimmed, pa.float64()), pa.float64()
+                # float64 holds integers exactly only up to 2**53; past that,
+                # decide per distinct cell.
+                largest = pc.max(pc.abs(numbers)).as_py() or 0
+                if largest > 2 ** 53 or any(abs(number) > 2 ** 53 for number in numeric):
+                    raise pa.ArrowInvalid("numbers beyond float64 precision")
+            if op == 'eq':
+                mask = pc.equal(numbers, pa.scalar(numeric[0], number_type))
+            elif op == 'in':
+                mask = pc.is_in(numbers, value_set=pa.array(numeric, number_type))
+            elif op == 'between':
+                mask = pc.and_(pc.greater_equal(numbers, numeric[0]), pc.less_equal(numbers, numeric[1]))
+            else:
+                mask = getattr(pc, range_ops[op])(numbers, numeric[0])
+        elif all(number is None for number in numeric):
+            texts = [str(item) for item in operands]
+            if op in ('eq', 'in'):
+                mask = pc.is_in(column, value_set=pa.array(texts, pa.string()))
+            elif op == 'between':
+                mask = pc.and_(pc.greater_equal(column, texts[0]), pc.less_equal(column, texts[1]))
+            else:
+                mask = getattr(pc, range_ops[op])(column, texts[0])
+        else:
+            raise pa.ArrowInvalid("mixed text and numeric operands")
+        return pc.fill_null(mask, False)
+    except pa.ArrowInvalid:
+        # Mixed text and numbers: decide once per distinct cell.
+        matches = [cell for cell in pc.unique(column).to_pylist() if cell_matches(cell, op, value)]
+        return pc.is_in(column, value_set=pa.array(matches, pa.string()))
+
+def csv_record_batches(csv_path, columns, include=None, block_size=16 * 1024 * 1024):
+    # Yield chunks of the CSV with every column (or just include) as text:
+    # pyarrow tables, or pandas DataFrames when pyarrow is not installed.
+    try:
+        import pyarrow as pa, pyarrow.csv as pacsv
+    except ImportError:
+        pa = None
+    if pa is not None:
+        reader = pacsv.open_csv(
+            csv_path,
+            read_options=pacsv.ReadOptions(block_size=block_size, use_threads=True),
+            parse_options=pacsv.ParseOptions(newlines_in_values=True),
+            convert_options=pacsv.ConvertOptions(column_types={name: pa.string() for name in columns},
+                                                 include_columns=include, strings_can_be_null=True))
+        for batch in reader:
+            yield pa.Table.from_batches([batch])
+        return
     import pandas as pd
+    for chunk in pd.read_csv(csv_path, dtype=str, usecols=include, chunksize=200_000):
+        yield chunk
+
+# Columnar sidecar: the first filter of a CSV also writes its rows as an Arrow
+# IPC file under .b10-cache next to the CSV, named by the CSV's (inode, size,
+# mtime) fingerprint, and later filters memory-map it instead of parsing
+# text. Columns listed in index_columns, or filtered index_after times, get an
+# equality index: the column's distinct values plus row ids grouped by value,
+# so a lookup compares only distinct values and touches only matching rows.
+def csv_fingerprint(csv_path):
+    import hashlib
+    st = os.stat(csv_path)
+    return hashlib.sha1(f"{st.st_ino}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()[:16]
+
+def mask_to_numpy(mask):
+    return (mask.combine_chunks() if hasattr(mask, 'combine_chunks') else mask).to_numpy(zero_copy_only=False)
+
+class CsvSidecar:
+    def __init__(self, csv_path, columns, index_after=2):
+        self.fingerprint = fingerprint = csv_fingerprint(csv_path)
+        self.csv_path = csv_path
+        self.columns = columns
+        self.index_after = index_after
+        self.cache_dir = os.path.join(os.path.dirname(os.path.abspath(csv_path)), '.b10-cache')
+        self.name = os.path.basename(csv_path)
+        self.base = os.path.join(self.cache_dir, f"{self.name}-{fingerprint}")
+        self.indexes = {}
+        self.table = self.load()
+
+    def load(self):
+        import pyarrow as pa
+        if not os.path.exists(f"{self.base}.arrow"):
+            self.build()
+        return pa.ipc.open_file(pa.memory_map(f"{self.base}.arrow")).read_all()
+
+    def build(self):
+        import pyarrow as pa
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.base}.arrow.tmp"
+        schema = pa.schema([(name, pa.string()) for name in self.columns])
+        with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+            for chunk in csv_record_batches(self.csv_path, self.columns):
+                writer.write_table(chunk)
+        os.replace(tmp_path, f"{self.base}.arrow")
+        # Sidecars of older versions of this CSV are stale now.
+        import re
+        stale = re.compile(re.escape(self.name) + r"-(?!" + self.fingerprint + r")[0-9a-f]{16}\..*")
+        for entry in os.listdir(self.cache_dir):
+            if stale.fullmatch(entry):
+                os.remove(os.path.join(self.cache_dir, entry))
+
+    def index_path(self, column, part):
+        import hashlib
+        return f"{self.base}.{hashlib.sha1(column.encode()).hexdigest()[:12]}.{part}"
+
+    def count_filter(self, column):
+        # Record a filter on column; returns how many times it has been filtered.
+        import json
+        path = f"{self.base}.filters.json"
+        try:
+            with open(path) as f:
+                counts = json.load(f)
+        except (FileNotFoundError, ValueError):
+            counts = {}
+        counts[column] = counts.get(column, 0) + 1
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(counts, f)
+        os.replace(f"{path}.tmp", path)
+        return counts[column]
+
+    def index(self, column):
+        # (distinct values, row ids ordered by value, offsets per value), building it if needed.
+        import numpy as np, pyarrow as pa, pyarrow.compute as pc
+        if column not in self.indexes:
+            if not os.path.exists(self.index_path(column, 'offsets.npy')):
+                encoded = pc.dictionary_encode(self.table.column(column)).combine_chunks()
+                codes = pc.fill_null(encoded.indices, -1).to_numpy().astype(np.int64)
+                order = np.argsort(codes, kind='stable')
+                offsets = np.concatenate([[0], np.cumsum(np.bincount(codes + 1, minlength=len(encoded.dictionary) + 1))])
+                with pa.OSFile(self.index_path(column, 'values.arrow'), 'wb') as sink, \
+                        pa.ipc.new_file(sink, pa.schema([('value', pa.string())])) as writer:
+                    writer.write_table(pa.table({'value': encoded.dictionary}))
+                np.save(self.index_path(column, 'order.npy'), order)
+                np.save(self.index_path(column, 'offsets.npy'), offsets)
+            values = pa.ipc.open_file(pa.memory_map(self.index_path(column, 'values.arrow'))).read_all().column('value')
+            # Offsets start with the null group (code -1), then one group per distinct value.
+            self.indexes[column] = (values, np.load(self.index_path(column, 'order.npy'), mmap_mode='r'),
+                                    np.load(self.index_path(column, 'offsets.npy'), mmap_mode='r'))
+        return self.indexes[column]
+
+    def matching_rows(self, predicates, indexed=()):
+        # Sorted row ids matching every predicate. The first predicate on an
+        # indexed column picks candidates through the index; the others are
+        # evaluated on those rows only.
+        import numpy as np, pyarrow.compute as pc
+        rows, remaining = None, list(predicates)
+        for i, (column, op, value) in enumerate(predicates):
+            if column in indexed or column in self.indexes or os.path.exists(self.index_path(column, 'offsets.npy')):
+                values, order, offsets = self.index(column)
+                codes = np.flatnonzero(mask_to_numpy(predicate_mask(values, op, value)))
+                rows = np.sort(np.concatenate([order[offsets[code + 1]:offsets[code + 2]] for code in codes] or [np.zeros(0, np.int64)]))
+                del remaining[i]
+                break
+        if not remaining:
+            return np.arange(len(self.table)) if rows is None else rows
+        table = self.table.select(list(dict.fromkeys(column for column, _, _ in remaining)))
+        if rows is not None:
+            table = table.take(rows)
+        mask = None
+        for column, op, value in remaining:
+            matched = predicate_mask(table.column(column), op, value)
+            mask = matched if mask is None else pc.and_(mask, matched)
+        selected = np.flatnonzero(mask_to_numpy(mask))
+        return selected if rows is None else rows[selected]
+
+csv_sidecars = {}
+
+def csv_sidecar(csv_path, columns):
+    # The (cached) sidecar for the current version of csv_path.
+    sidecar = csv_sidecars.get(csv_path)
+    if sidecar is None or sidecar.fingerprint != csv_fingerprint(csv_path) or sidecar.columns != columns:
+        sidecar = csv_sidecars[csv_path] = CsvSidecar(csv_path, columns)
+    return sidecar
+
+def filter_csv(csv_path, predicates, columns=None, use_cache=True, index_columns=(), batch_size=65536):
+    # Yield lists of rows (dicts of column -> text or None, limited to columns)
+    # matching every (column, op, value) predicate, in file order.
+    header = csv_header(csv_path)
+    columns = list(columns or header)
+    for column in columns + [column for column, _, _ in predicates]:
+        if column not in header:
+            raise KeyError(f"Column {column!r} not found in {csv_path}")
+    try:
+        import pyarrow
+    except ImportError:
+        use_cache = False
+    sidecar = None
+    if use_cache:
+        try:
+            sidecar = csv_sidecar(csv_path, header)
+        except OSError:
+            pass  # e.g. a read-only directory: stream the text instead
+    if sidecar is not None:
+        indexed = {column for column, _, _ in predicates
+                   if column in index_columns or sidecar.count_filter(column) >= sidecar.index_after}
+        rows = sidecar.matching_rows(predicates, indexed)
+        table = sidecar.table.select(columns)
+        for start in range(0, len(rows), batch_size):
+            yield table.take(rows[start:start + batch_size]).to_pylist()
+        return
+    include = list(dict.fromkeys(columns + [column for column, _, _ in predicates]))
+    for chunk in csv_record_batches(csv_path, header, include):
+        if hasattr(chunk, 'to_pylist'):
+            import pyarrow.compute as pc
+            mask = None
+            for column, op, value in predicates:
+                matched = predicate_mask(chunk.column(column), op, value)
+                mask = matched if mask is None else pc.and_(mask, matched)
+            rows = (chunk if mask is None else chunk.filter(mask)).select(columns).to_pylist()
+        else:
+            mask = None
+            for column, op, value in predicates:
+                matched = chunk[column].map(lambda cell: cell_matches(cell if isinstance(cell, str) else None, op, value))
+                mask = matched if mask is None else mask & matched
+            matched = (chunk if mask is None else chunk[mask.astype(bool)])[columns]
+            rows = matched.astype(object).where(matched.notna(), None).to_dict(orient='records')
+        if rows:
+            yield rows
+
+def sort_rows(rows, sort):
+    # Sort rows in place by [(column, descending)], numbers before text, nulls last.
+    for column, descending in reversed(sort):
+        def key(row):
+            cell = row[column]
+            if cell is None:
+                return (-1 if descending else 2,)
+            number = numeric_value(cell)
+            return (0, number) if number is not None else (1, cell)
+        rows.sort(key=key, reverse=descending)
+
+def write_json_rows(batches, output_path):
+    # Write row batches as a JSON array, or JSON Lines for .jsonl/.ndjson; returns the row count.
+    import json
+    lines = os.path.splitext(output_path)[1].lower() in ('.jsonl', '.ndjson')
+    count = 0
+    with open(output_path, 'w', encoding='utf-8') as out:
+        if not lines:
+            out.write('[')
+        for rows in batches:
+            for row in rows:
+                if lines:
+                    out.write(json.dumps(row, separators=(',', ':')) + '\n')
+                else:
+                    out.write((',' if count else '') + json.dumps(row, separators=(',', ':')))
+                count += 1
+        if not lines:
+            out.write(']')
+    return count
+
+def B10(csv_path, filter_column=None, filter_value=None, output_path=None, use_cache=True, index_columns=None,
+        predicates=None, columns=None, sort=None, limit=None):
+    import itertools, logging
     from pathlib import Path
 
+    if output_path is None:
+        raise ValueError("output_path is required")
     # Ensure both the CSV file and output file are under /data.
     if not (B12(csv_path) and B12(output_path)):
         raise PermissionError("CSV file or output file not under /data.")
-    
-    csv_file = Path(csv_path)
-    out_file = Path(output_path)
-    
+
     # Ensure the directory for the output file exists.
-    out_file.parent.mkdir(parents=True, exist_ok=True)
-    
-    # Read the CSV file.
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+
+    # filter_column == filter_value plus any predicates, all applied in one pass.
+    filters = [(filter_column, 'eq', filter_value)] if filter_column is not None else []
+    for predicate in predicates or []:
+        if predicate.get('op', 'eq') not in predicate_ops:
+            raise ValueError(f"Unknown filter operator {predicate.get('op')!r}; expected one of {sorted(predicate_ops)}")
+        filters.append((predicate['column'], predicate.get('op', 'eq'), predicate.get('value')))
+    # sort: a column name or list of them, "-" in front for descending.
+    sort = [(key[1:], True) if key.startswith('-') else (key, False) for key in ([sort] if isinstance(sort, str) else sort or [])]
+    fetch = None
+    if columns:
+        fetch = list(dict.fromkeys(list(columns) + [column for column, _ in sort]))
+
+    # Stream matching rows into the output file.
     try:
-        df = pd.read_csv(csv_file)
-    except Exception as e:
-        raise Exception(f"Error reading CSV file {csv_file}: {e}")
-    
-    # Filter rows where filter_column equals filter_value (as a string).
-    filtered = df[df[filter_column] == str(filter_value)]
-    json_output = filtered.to_json(orient="records")
-    
-    # Write the JSON output using pathlib's write_text method.
-    out_file.write_text(json_output, encoding="utf-8")
-    
-    # Debug: Print the absolute path and whether the file exists.
-    debug_path = out_file.resolve()
-    print("DEBUG: Output file absolute path:", debug_path)
-    print("DEBUG: Does output file exist?", out_file.exists())
-    print("DEBUG: Filtered JSON output:", json_output)
-    
-    return json_output
+        batches = filter_csv(csv_path, filters, fetch, use_cache, index_columns or ())
+        if sort:
+            rows = [row for batch in batches for row in batch]
+            sort_rows(rows, sort)
+            if columns:
+                rows = [{column: row[column] for column in columns} for row in rows]
+            batches = [rows[:limit]]
+        elif limit is not None:
+            rows = itertools.islice((row for batch in batches for row in batch), limit)
+            batches = iter(lambda: list(itertools.islice(rows, 65536)), [])
+        count = write_json_rows(batches, output_path)
+    except (OSError, UnicodeDecodeError) as e:
+        raise Exception(f"Error reading CSV file {csv_path}: {e}")
+    stats = {"rows": count, "bytes": os.path.getsize(output_path)}
+    logging.getLogger(__name__).info("B10 wrote %(rows)d rows, %(bytes)d bytes", stats)
+    return stats
 
+# B11: SQL over data files. DuckDB scans CSV, JSON/JSONL and Parquet files in
+# place, in parallel and reading only the columns and row groups the query
+# needs, and COPY writes csv/json/jsonl/parquet results without the rows
+# passing through Python. Queries may name files directly
+# (FROM '/data/sales.csv') or through the tables mapping. Before the query
+# runs, file access is confined to data_root and the configuration locked.
+data_root = "/data"
+data_file_readers = {
+    ".csv": "read_csv_auto", ".tsv": "read_csv_auto", ".txt": "read_csv_auto",
+    ".json": "read_json_auto", ".jsonl": "read_json_auto", ".ndjson": "read_json_auto",
+    ".parquet": "read_parquet",
+}
+copy_formats = {
+    ".csv": "FORMAT csv, HEADER true",
+    ".json": "FORMAT json, ARRAY true",
+    ".jsonl": "FORMAT json",
+    ".ndjson": "FORMAT json",
+    ".parquet": "FORMAT parquet",
+}
 
+def B11(query, output_filename, tables=None, max_rows=None, threads=None, memory_limit=None):
+    tables = tables or {}
+    if not (B12(output_filename) and all(B12(path) for path in tables.values())):
+        raise PermissionError("Data files and output file must be under /data.")
+    import logging
+    quote = lambda text: "'" + text.replace("'", "''") + "'"
+    with duckdb_connection(threads, memory_limit) as conn:
+        for name, path in tables.items():
+            reader = data_file_readers.get(os.path.splitext(path)[1].lower())
+            if reader is None:
+                raise ValueError(f"Unsupported data file type: {path}")
+            conn.execute(f'CREATE VIEW "{name.replace(chr(34), chr(34) * 2)}" AS SELECT * FROM {reader}({quote(path)})')
+        conn.execute(f"SET allowed_directories = [{quote(data_root.rstrip('/') + '/')}]")
+        conn.execute("SET enable_external_access = false")
+        conn.execute("SET lock_configuration = true")
+        query = query.strip().rstrip(';')
+        if max_rows is not None:
+            query = f"SELECT * FROM ({query}) LIMIT {int(max_rows)}"
+        copy_format = copy_formats.get(os.path.splitext(output_filename)[1].lower())
+        if copy_format:
+            rows = conn.execute(f"COPY ({query}) TO {quote(output_filename)} ({copy_format})").fetchone()[0]
+            stats = {"rows": rows, "bytes": os.path.getsize(output_filename),
+                     "truncated": max_rows is not None and rows >= max_rows}
+        else:
+            cur = conn.execute(query)
+            stats = write_query_result([column[0] for column in cur.description or []],
+                                       iter(lambda: cur.fetchmany(10000), []), output_filename, max_rows)
+    logging.getLogger(__name__).info("B11 wrote %(rows)d rows, %(bytes)d bytes (truncated: %(truncated)s)", stats)
+    return stats
@@ -0,0 +1,205 @@
+# test_http_tasks.py
+
+# B3/B6 downloads against a local http.server stub: bytes arrive intact,
+# interrupted bodies resume with a 206, a complete .part is accepted on a 416
+# and a changed validator restarts the download. The B6 crawl mode runs
+# against a small stub site: selectors, link depth, robots.txt and max_pages.
+
+# Usage: python -m pytest -q test_http_tasks.py  (or python -m unittest test_http_tasks)
+
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import tasksB
+
+BODY = bytes(range(256)) * 8192  # 2 MiB covering every byte value
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    etag = '"v1"'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("Range"), self.headers.get("If-Range")))
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range") in (None, self.etag):
+            start = int(range_header.split("=")[1].rstrip("-"))
+            if start >= len(BODY):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(BODY)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(BODY) - 1}/{len(BODY)}")
+        else:
+            self.send_response(200)
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(BODY) - start))
+        self.end_headers()
+        data = BODY[start:]
+        if self.path == "/flaky" and not self.server.cut:
+            self.server.cut = True
+            self.wfile.write(data[:700_000])
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        self.wfile.write(data)
+
+
+class StubServerTestCase(unittest.TestCase):
+    handler = StubHandler
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler)
+        self.server.requests, self.server.cut = [], False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+
+class DownloadTest(StubServerTestCase):
+    def test_binary_bytes_arrive_intact(self):
+        result = tasksB.download(self.base + "/file", self.path("out.bin"))
+        with open(self.path("out.bin"), "rb") as f:
+            self.assertEqual(f.read(), BODY)
+        self.assertEqual(result["bytes"], len(BODY))
+        self.assertFalse(os.path.exists(self.path("out.bin.part")))
+
+    def test_interrupted_body_resumes_with_206(self):
+        result = tasksB.download(self.base + "/flaky", self.path("out.bin"))
+        with open(self.path("out.bin"), "rb") as f:
+            self.assertEqual(f.read(), BODY)
+        self.assertGreater(result["resumed"], 0)
+        self.assertEqual(result["status"], 206)
+        _, range_header, if_range = self.server.requests[-1]
+        self.assertEqual(range_header, f"bytes={result['resumed']}-")
+        self.assertEqual(if_range, '"v1"')
+
+    def test_complete_part_is_accepted_on_416(self):
+        with open(self.path("out.bin.part"), "wb") as f:
+            f.write(BODY)
+        result = tasksB.download(self.base + "/file", self.path("out.bin"))
+        with open(self.path("out.bin"), "rb") as f:
+            self.assertEqual(f.read(), BODY)
+        self.assertEqual(result["resumed"], len(BODY))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_changed_validator_restarts_download(self):
+        with open(self.path("out.bin.part"), "wb") as f:
+            f.write(b"stale" * 100)
+        with open(self.path("out.bin.part.validator"), "w") as f:
+            f.write('"v0"')
+        result = tasksB.download(self.base + "/file", self.path("out.bin"))
+        with open(self.path("out.bin"), "rb") as f:
+            self.assertEqual(f.read(), BODY)
+        self.assertEqual(result["resumed"], 0)
+        self.assertEqual(result["status"], 200)
+
+    def test_progress_reports_content_length(self):
+        seen = []
+        tasksB.download(self.base + "/file", self.path("out.bin"), progress=lambda done, total: seen.append((done, total)))
+        self.assertEqual(seen[-1], (len(BODY), len(BODY)))
+
+    def test_b3_and_b6_write_bytes_without_cache(self):
+        original = tasksB.B12
+        tasksB.B12 = lambda path: True
+        self.addCleanup(setattr, tasksB, "B12", original)
+        tasksB.B3(self.base + "/file", self.path("b3.bin"), use_cache=False)
+        tasksB.B6(self.base + "/file", self.path("b6.bin"), use_cache=False)
+        for name in ("b3.bin", "b6.bin"):
+            with open(self.path(name), "rb") as f:
+                self.assertEqual(f.read(), BODY)
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    # /index links to /page/0../page/9; each page links to /deep/<n> and /private/<n>.
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, None, None))
+        if self.path == "/robots.txt":
+            body = "User-agent: *\nDisallow: /private/\n"
+        elif self.path == "/index":
+            body = "<html><body><h1>Index</h1>" + "".join(f'<a href="/page/{i}">p{i}</a>' for i in range(10)) + "</body></html>"
+        else:
+            name = self.path.rsplit("/", 1)[-1]
+            body = (f'<html><head><title>T{name}</title><script>var s = "<h1>no</h1>";</script></head><body>'
+                    f'<div id="main"><h1 class="title">Page &amp; {name}</h1>'
+                    f'<ul class="tags"><li>a<li>b</ul><span class="price" data-v="{name}">$ {name}</span>'
+                    f'<img src="/img/{name}.png"></div>'
+                    f'<a href="/deep/{name}">deep</a><a href="/private/{name}">private</a></body></html>')
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class CrawlTest(StubServerTestCase):
+    handler = SiteHandler
+    fields = {"title": "title", "heading": "div#main > h1.title", "price": "span.price::text",
+              "value": "span.price::attr(data-v)", "tags": ["ul.tags li"], "image": "img::attr(src)"}
+
+    def crawl(self, **options):
+        output = self.path("crawl.jsonl")
+        options = {"fields": self.fields, "delay": 0, "per_host": 4, **options}
+        stats = tasksB.B6(self.base + "/index", output, **options)
+        with open(output, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        return stats, {record["url"][len(self.base):]: record for record in records}
+
+    def test_fields_are_extracted(self):
+        _, records = self.crawl(follow=r"/page/")
+        page = records["/page/3"]
+        self.assertEqual(page["title"], "T3")
+        self.assertEqual(page["heading"], "Page & 3")
+        self.assertEqual(page["price"], "$ 3")
+        self.assertEqual(page["value"], "3")
+        self.assertEqual(page["tags"], ["a", "b"])
+        self.assertEqual(page["image"], self.base + "/img/3.png")
+
+    def test_depth_limits_link_following(self):
+        _, records = self.crawl(follow=r"/(page|deep)/", max_depth=1)
+        self.assertEqual(len([url for url in records if url.startswith("/page/")]), 10)
+        self.assertFalse(any(url.startswith("/deep/") for url in records))
+        _, records = self.crawl(follow=r"/(page|deep)/", max_depth=2)
+        self.assertEqual(len([url for url in records if url.startswith("/deep/")]), 10)
+
+    def test_robots_txt_is_honoured(self):
+        _, records = self.crawl(follow=r"/(page|private)/", max_depth=2)
+        private = [record for url, record in records.items() if url.startswith("/private/")]
+        self.assertEqual(len(private), 10)
+        self.assertTrue(all(record["error"] == "disallowed by robots.txt" for record in private))
+        self.assertFalse(any(path.startswith("/private/") for path, _, _ in self.server.requests))
+
+    def test_max_pages_caps_the_crawl(self):
+        stats, records = self.crawl(follow=r"/(page|deep)/", max_depth=2, max_pages=5)
+        self.assertEqual(len(records), 5)
+        self.assertEqual(stats["pages"], 5)
+        self.assertIn("/index", records)
+
+
+if __name__ == "__main__":
+    unittest.main()